@@ -8,24 +8,196 @@
 #####################################
 
 import time
+import json
+import heapq
+import itertools
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+from array import array
+from collections import OrderedDict
 import threading
 from threading import Thread
 from random import randint
 from colors import *
+from outputs import *
+from network import FrameSender, FrameReceiver, UniverseReceiver
+from gradient import gradient
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+clock = time.time
+
+class FrameStats:
+    # Per-frame timings for a Strip, kept in a fixed size ring. Times are in
+    # seconds; render is the time spent in animations, compose the dirty
+    # scan and building the frame in getFrame() (putting rotated streams
+    # back in order, blending layers and expanding palettes) and write the
+    # time spent handing it to the output. A frame is late when it started
+    # after its slot had already ended.
+    def __init__(self, size = 600):
+        self.size = size
+        self.count = 0
+        self.missed = 0
+        self.hooks = list()
+        self.streamtimes = dict()
+        self.frame = array('l', [0]) * size
+        self.time = array('d', [0.0]) * size
+        self.render = array('d', [0.0]) * size
+        self.compose = array('d', [0.0]) * size
+        self.write = array('d', [0.0]) * size
+        self.late = array('b', [0]) * size
+        self.written = array('b', [0]) * size
 
-class Strip(threading.Thread):
-    def __init__(self, num = 80, fname = '/dev/spidev0.0', sleeptime = 0.0005, pixel_size = 3):
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def addHook(self, hook):
+        # hook(stats, index) is called after every recorded frame
+        self.hooks.append(hook)
+
+    def addStreamTime(self, stream, elapsed):
+        entry = self.streamtimes.get(stream)
+        if entry is None:
+            entry = self.streamtimes[stream] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def record(self, frame, start, render, compose, write, late, written):
+        i = self.count % self.size
+        self.frame[i] = frame
+        self.time[i] = start
+        self.render[i] = render
+        self.compose[i] = compose
+        self.write[i] = write
+        self.late[i] = late
+        self.written[i] = written
+        self.count += 1
+        if late:
+            self.missed += 1
+        for hook in self.hooks:
+            hook(self, i)
+
+    def indexes(self):
+        # ring positions, oldest first
+        n = len(self)
+        first = self.count - n
+        return [(first + x) % self.size for x in xrange(n)]
+
+    def getRecords(self):
+        return [{'frame': self.frame[i], 'time': self.time[i],
+                 'render': self.render[i], 'compose': self.compose[i],
+                 'write': self.write[i], 'late': bool(self.late[i]),
+                 'written': bool(self.written[i])} for i in self.indexes()]
+
+    def fps(self):
+        # frames actually written per second over the ring
+        times = [self.time[i] for i in self.indexes() if self.written[i]]
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def summary(self):
+        idx = self.indexes()
+        n = float(len(idx)) or 1.0
+        streams = list()
+        for stream, (count, total) in self.streamtimes.items():
+            streams.append({'offset': stream.offset / stream.pixel_size,
+                            'leds': stream.num_leds, 'runs': count,
+                            'time': total, 'avg': total / count})
+        streams.sort(key = lambda x: x['offset'])
+        return {'frames': self.count, 'missed': self.missed, 'fps': self.fps(),
+                'render': sum(self.render[i] for i in idx) / n,
+                'compose': sum(self.compose[i] for i in idx) / n,
+                'write': sum(self.write[i] for i in idx) / n,
+                'streams': streams}
+
+    def dump(self, fileobj = None, records = False):
+        out = self.summary()
+        if records:
+            out['records'] = self.getRecords()
+        if fileobj is None:
+            return json.dumps(out, sort_keys = True)
+        json.dump(out, fileobj, sort_keys = True)
+
+class FrameClock:
+    # Frame timing shared by Strip and StripController. Users provide
+    # nextFrame() and isDirty() and a threading.Event in self.wakeup.
+    def setClock(self, fps, starttime = None):
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.starttime = starttime if starttime is not None else clock()
+
+    def currentFrame(self):
+        return int((clock() - self.starttime) * self.fps)
+
+    def frameTime(self, frame):
+        return self.starttime + frame * self.period
+
+    def notify(self):
+        self.wakeup.set()
+
+    def waitFrame(self):
+        # Sleep until the next animation deadline, or until woken by a new
+        # animation or an outside change to a stream. Returns the frame
+        # number to process.
+        self.wakeup.clear()
+        nextframe = self.nextFrame()
+        frame = self.currentFrame()
+        if self.isDirty():
+            return frame
+        if nextframe is None:
+            self.wakeup.wait()
+        elif nextframe > frame:
+            self.wakeup.wait(self.frameTime(nextframe) - clock())
+        return max(self.currentFrame(), frame)
+
+class Strip(threading.Thread, FrameClock):
+    def __init__(self, num = 80, fname = '/dev/spidev0.0', sleeptime = 0.0005, pixel_size = 3, fps = None):
         threading.Thread.__init__(self)
         self.num_leds = num
         self.leds_left = num
         self.pixel_size = pixel_size
         self.streams = list()
         self.sleeptime = sleeptime
+        # Without an explicit fps one frame lasts sleeptime, which keeps
+        # animation waits tuned against the old polling loop the same.
+        self.setClock(fps if fps else 1.0 / sleeptime)
+        self.framenum = 0
+        self.schedule = list()
+        self.schedlock = threading.Lock()
+        # held by other threads (network receivers) while they change a
+        # stream, and by show() while it takes the frame
+        self.framelock = threading.Lock()
+        self.schedseq = itertools.count()
+        self.wakeup = threading.Event()
+        self.frame = bytearray(num * pixel_size)
+        self.frameview = memoryview(self.frame)
+        self.frameused = 0
         self.data = self.newstream(num, False)
         self.stripstream = False
-        self.strip = file(fname, "wb")
+        self.strip = openOutput(fname)
+        self.layers = list()
+        self.rotated = set()
+        self.composite = None
+        self.compositeview = None
         self.name = "Strip Scheduling Thread"
         self.dorun = True
+        self.stats = None
+        self.composetime = 0.0
+        self.workers = list()
+        self.owned = dict()
+        self.indexed = list()
 
     def __getitem__(self, key):
         return self.streams[key]
@@ -43,68 +215,586 @@ class Strip(threading.Thread):
                 raise RuntimeError('Not Enough LEDS Left')
 
 
-            self.streams.append(Stream(num_leds, self, self.pixel_size))
+            # Streams are windows onto the strip frame buffer, so the frame
+            # is already composed by the time show() is called.
+            start = self.frameused
+            self.frameused += num_leds * self.pixel_size
+            view = self.frameview[start:self.frameused]
+            self.streams.append(Stream(num_leds, self, self.pixel_size, view, start))
             self.leds_left -= num_leds
             return self.streams[-1]
 
         else:
             return Stream(num_leds, self, self.pixel_size)
 
+    def newindexed(self, num_leds, palette):
+        # A stream holding one palette index per LED, expanded into the
+        # frame through palette when it is shown
+        if num_leds > self.leds_left:
+            raise RuntimeError('Not Enough LEDS Left')
+        if palette.pixel_size != self.pixel_size:
+            raise ValueError('Palette pixel size does not match the strip')
+        start = self.frameused
+        self.frameused += num_leds * self.pixel_size
+        view = self.frameview[start:self.frameused]
+        stream = IndexedStream(num_leds, self, palette, view, start)
+        self.streams.append(stream)
+        self.indexed.append(stream)
+        self.leds_left -= num_leds
+        return stream
+
+    def newlayer(self, num_leds = None, start = 0, mode = 'alpha', opacity = 0.0):
+        # Layers overlay the streams (and each other, in creation order) on
+        # any range of LEDs, and are blended in when the frame is shown. A
+        # new layer is transparent until given an opacity, so adding one
+        # does not black out what is under it.
+        if num_leds is None:
+            num_leds = self.num_leds - start
+        if start < 0 or start + num_leds > self.num_leds:
+            raise RuntimeError('Layer does not fit on the strip')
+        self.layers.append(Layer(num_leds, self, self.pixel_size, start, mode, opacity))
+        return self.layers[-1]
+
+    def removelayer(self, layer):
+        self.layers.remove(layer)
+        self.rotated.discard(layer)
+        # the streams under the layer have to be pushed again
+        for stream in self.streams:
+            stream.markDirty()
+
+    def streamRotated(self, stream, rotation):
+        # Only streams that are part of the frame (or a layer) are tracked
+        if not rotation:
+            self.rotated.discard(stream)
+        elif stream in self.streams or stream in self.layers:
+            self.rotated.add(stream)
+
+    def compose(self):
+        # Frame with rotated streams put back in order and every visible
+        # layer blended over the streams. The streams' own buffer is left
+        # alone, as animations read it back.
+        if self.composite is None:
+            self.composite = bytearray(len(self.frame))
+            self.compositeview = memoryview(self.composite)
+        out = self.compositeview
+        out[:] = self.frame
+        for stream in self.rotated:
+            if not isinstance(stream, Layer):
+                stream.copyTo(out[stream.offset:stream.offset + stream.pixnum])
+        for layer in self.layers:
+            if layer.opacity > 0:
+                blend_layer(out[layer.offset:layer.offset + layer.pixnum],
+                            layer.logical(), layer.mode, layer.opacity)
+        return out
+
 
     def clear(self):
-        self.strip.write(bytearray(self.num_leds * self.pixel_size))
-        self.strip.flush()
+        self.write(bytearray(self.num_leds * self.pixel_size))
         return
 
 
+    def scheduleStream(self, stream, frame = None):
+        # Queue stream to be ticked at frame (default: as soon as possible)
+        if stream in self.owned:
+            raise RuntimeError('Stream is rendered by a worker process')
+        if frame is None:
+            frame = self.framenum
+        with self.schedlock:
+            if stream.scheduled:
+                return
+            stream.scheduled = True
+            heapq.heappush(self.schedule, (frame, next(self.schedseq), stream))
+        self.notify()
+
+    def nextFrame(self):
+        # frame number of the earliest scheduled animation, or None
+        with self.schedlock:
+            nextframe = self.schedule[0][0] if self.schedule else None
+        for worker in self.workers:
+            if worker.next is not None and (nextframe is None or worker.next < nextframe):
+                nextframe = worker.next
+        return nextframe
+
+    def enableParallel(self, workers = None):
+        # Render streams in worker processes (one per core by default),
+        # which write straight into the frame buffer, moved to shared
+        # memory here. The streams with animations queued are split between
+        # the workers by LED count and take those animations with them;
+        # queue everything before calling this, as animating a worker's
+        # stream afterwards raises, and so does calling this once the strip
+        # is running. Layers stay in this process.
+        if self.workers:
+            raise RuntimeError('Parallel rendering is already enabled')
+        if self.is_alive():
+            raise RuntimeError('Enable parallel rendering before starting the strip')
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        shared = RawArray('B', len(self.frame))
+        view = memoryview(shared)
+        view[:] = self.frame
+        self.frame = shared
+        self.frameview = view
+        for stream in self.streams:
+            stream.setView(view[stream.offset:stream.offset + stream.pixnum])
+
+        groups = [RenderWorker() for _ in xrange(workers)]
+        # indexed streams keep their indices in this process
+        streams = [s for s in self.streams if s.animqueue and s not in self.indexed]
+        streams.sort(key = lambda s: -s.num_leds)
+        for stream in streams:
+            worker = min(groups, key = lambda w: w.leds)
+            worker.indices.append(self.streams.index(stream))
+            worker.leds += stream.num_leds
+
+        # forked outside the schedule lock, so no child inherits it held
+        for worker in groups:
+            if not worker.indices:
+                continue
+            owned = set(self.streams[i] for i in worker.indices)
+            with self.schedlock:
+                frames = [entry[0] for entry in self.schedule if entry[2] in owned]
+            worker.next = min(frames) if frames else None
+            worker.start(self)
+            for stream in owned:
+                self.owned[stream] = worker
+            self.workers.append(worker)
+        with self.schedlock:
+            self.schedule = [entry for entry in self.schedule if entry[2] not in self.owned]
+            heapq.heapify(self.schedule)
+        return len(self.workers)
+
+    def stopParallel(self):
+        # The animations a worker was running end with it, so its streams'
+        # queues are emptied and the streams can be animated here again
+        for worker in self.workers:
+            worker.stop()
+        for stream in self.owned:
+            stream.scheduled = False
+            del stream.animqueue[:]
+        self.workers = list()
+        self.owned = dict()
+
+    def gather(self, worker):
+        # Take in what a worker rendered
+        changed, finished, worker.next = worker.conn.recv()
+        for index, low, high, rotation in changed:
+            stream = self.streams[index]
+            stream.setRotation(rotation)
+            stream.markDirty(low, high)
+        for index in finished:
+            stream = self.streams[index]
+            self.animationFinished(stream, stream.animqueue.pop(0))
+
+    def render(self, frame, stats = None):
+        # Run every animation due at frame, without writing anything out
+        self.framenum = frame
+        busy = list()
+        for worker in self.workers:
+            if worker.next is not None and worker.next <= frame:
+                worker.conn.send(frame)
+                busy.append(worker)
+        due = list()
+        with self.schedlock:
+            while self.schedule and self.schedule[0][0] <= frame:
+                stream = heapq.heappop(self.schedule)[2]
+                stream.scheduled = False
+                due.append(stream)
+
+        for stream in due:
+            if not stream.animqueue:
+                continue
+            anim = stream.animqueue[0]
+            if stats is not None:
+                started = clock()
+            wake = anim.advance(frame)
+            if stats is not None:
+                stats.addStreamTime(stream, clock() - started)
+            if wake is None:
+                stream.removeAnim(anim)
+                self.animationFinished(stream, anim)
+                wake = frame + 1
+            if stream.animqueue:
+                self.scheduleStream(stream, wake)
+
+        for worker in busy:
+            self.gather(worker)
+
+    def tick(self, frame):
+        if self.stats is not None:
+            return self.timedTick(frame)
+        self.render(frame)
+        # An animation that is only waiting out its sleep() leaves its
+        # stream clean, so nothing is pushed.
+        if self.isDirty():
+            self.show()
+
+    def timedTick(self, frame):
+        stats = self.stats
+        start = clock()
+        late = start > self.frameTime(frame + 1)
+        self.render(frame, stats)
+        rendered = clock()
+        self.composetime = 0.0
+        written = self.isDirty()
+        scanned = clock()
+        if written:
+            self.show()
+        done = clock()
+        compose = scanned - rendered + self.composetime
+        stats.record(frame, start, rendered - start, compose,
+                     done - scanned - self.composetime, late, written)
+
+    def enableStats(self, size = 600):
+        self.stats = FrameStats(size)
+        return self.stats
+
+    def disableStats(self):
+        self.stats = None
+
+    def getStats(self):
+        return self.stats
+
+    def animationFinished(self, stream, animation):
+        return
+
     def run(self):
+        self.starttime = clock()
         while self.dorun:
-            updated = False
-            for stream in self.streams:
-                if stream.hasAnimation():
-                    updated = True
-                    anim = stream.getAnimation()
-                    if anim.isFirstRun():
-                        anim.start()
-                    else:
-                        anim._run()
-                    if anim.isFinished():
-                        stream.removeAnim(anim)
-
-            if updated: self.show()
-            time.sleep(self.sleeptime)
+            frame = self.waitFrame()
+            if self.dorun:
+                self.tick(frame)
+        self.stopParallel()
 
     def stop(self):
         self.dorun = False
+        self.wakeup.set()
 
     def restart(self):
         self.dorun = True
         self.start()
 
+    def isDirty(self):
+        for stream in self.streams:
+            if stream.dirty:
+                return True
+        for layer in self.layers:
+            if layer.dirty:
+                return True
+        return False
+
+    def getDirtyRange(self):
+        low = None
+        high = None
+        for stream in self.streams + self.layers:
+            if stream.dirty:
+                start = stream.offset + stream.dirtylow
+                end = stream.offset + stream.dirtyhigh
+                low = start if low is None else min(low, start)
+                high = end if high is None else max(high, end)
+        if low is None:
+            return None
+        return (low, high)
+
+    def write(self, data):
+        self.strip.write(data)
+
+    def listen(self, port = 7777, host = '', stream = None):
+        # Take frames for stream (by default one covering the LEDs still
+        # free) from a FrameSender on the network
+        if stream is None:
+            stream = self.newstream(self.leds_left)
+        receiver = FrameReceiver(stream, port, host)
+        receiver.start()
+        return receiver
+
+    def listenUniverses(self, universe = 1, protocol = 'e131', stream = None, leds = 170,
+                        port = None, host = '', multicast = False):
+        # Take stream's pixels from DMX universes (170 LEDs each by default)
+        # starting at universe, sent by a lighting desk over E1.31 or Art-Net
+        if stream is None:
+            stream = self.newstream(self.leds_left)
+        receiver = UniverseReceiver(protocol, port, host, multicast)
+        receiver.mapStream(stream, universe, leds)
+        receiver.start()
+        return receiver
+
+    def getFrame(self):
+        # what show() writes out
+        for stream in self.indexed:
+            if stream.dirty:
+                stream.expand()
+        if self.layers or self.rotated:
+            return self.compose()
+        return self.frameview[:self.frameused]
+
+    def clean(self):
+        for stream in self.streams:
+            stream.clean()
+        for layer in self.layers:
+            layer.clean()
+
+    def composeFrame(self):
+        # getFrame(), timed for the frame stats
+        if self.stats is None:
+            return self.getFrame()
+        started = clock()
+        data = self.getFrame()
+        self.composetime += clock() - started
+        return data
+
     def show(self):
-            self.strip.write(sum(self.streams))
-            self.strip.flush()
-            #print(sum(self.streams))
+            # Taking the frame and marking it clean under the frame lock
+            # means a change from another thread is either in this frame or
+            # still dirty for the next one.
+            with self.framelock:
+                data = self.composeFrame()
+                self.clean()
+            self.write(data)
             return
 
-class Stream:
-    def __init__(self, num, parent, pixel_size = 3):
+class RenderWorker:
+    # One worker process of a Strip with parallel rendering, and the
+    # indices of the strip's streams it renders
+    def __init__(self):
+        self.indices = list()
+        self.leds = 0
+        self.next = None
+        self.conn = None
+        self.process = None
+
+    def start(self, strip):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target = renderWorker, args = (child, strip, self.indices))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+def renderWorker(conn, strip, indices):
+    # Runs in a forked copy of strip, rendering the streams at indices for
+    # every frame number sent down conn. The pixels land in the shared
+    # frame buffer; what changed goes back up conn.
+    index = dict((strip.streams[i], i) for i in indices)
+    finished = list()
+    strip.stats = None
+    strip.layers = list()
+    strip.workers = list()
+    strip.owned = dict()
+    strip.schedule = [entry for entry in strip.schedule if entry[2] in index]
+    heapq.heapify(strip.schedule)
+    strip.animationFinished = lambda stream, anim: finished.append(index[stream])
+    for stream in index:
+        stream.clean()
+
+    while True:
+        frame = conn.recv()
+        if frame is None:
+            break
+        strip.render(frame)
+        changed = list()
+        for stream, i in index.iteritems():
+            if stream.dirty:
+                changed.append((i, stream.dirtylow, stream.dirtyhigh, stream.rotation))
+                stream.clean()
+        conn.send((changed, finished, strip.nextFrame()))
+        del finished[:]
+    conn.close()
+
+class AsyncStrip(Strip):
+    # Drives the same frame scheduler from an asyncio (or trollius) event
+    # loop instead of a thread of its own, so one loop can run many strips.
+    # Call begin() from the loop; animate() returns a future that resolves
+    # when the animation finishes and removes the animation if cancelled.
+    def __init__(self, num = 80, fname = '/dev/spidev0.0', sleeptime = 0.0005, pixel_size = 3, fps = None, loop = None, executor = None):
+        if asyncio is None:
+            raise RuntimeError('AsyncStrip needs asyncio or trollius')
+        self.loop = loop if loop else asyncio.get_event_loop()
+        self.executor = executor
+        self.handle = None
+        self.pending = False
+        self.ticking = False
+        self.writing = None
+        self.futures = dict()
+        Strip.__init__(self, num, fname, sleeptime, pixel_size, fps)
+        self.name = "Async Strip"
+        self.dorun = False
+
+    def begin(self):
+        self.starttime = clock()
+        self.dorun = True
+        self.reschedule()
+
+    def stop(self):
+        self.dorun = False
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def animate(self, stream, animation):
+        future = asyncio.Future(loop = self.loop)
+        self.futures[animation] = future
+
+        def cancelled(f):
+            if f.cancelled() and animation in stream.animqueue:
+                stream.removeAnim(animation)
+                self.futures.pop(animation, None)
+
+        future.add_done_callback(cancelled)
+        stream.animate(animation)
+        return future
+
+    def animationFinished(self, stream, animation):
+        future = self.futures.pop(animation, None)
+        if future is not None and not future.done():
+            future.set_result(animation)
+
+    def notify(self):
+        # Ticks reschedule themselves once they are done, and one pending
+        # wakeup is enough for any number of changes from other threads.
+        if self.ticking or self.pending:
+            return
+        self.pending = True
+        self.loop.call_soon_threadsafe(self.reschedule)
+
+    def reschedule(self):
+        self.pending = False
+        if not self.dorun:
+            return
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if self.writing is not None:
+            # written() reschedules once the bus is free again
+            return
+        if self.isDirty():
+            self.handle = self.loop.call_soon(self.step)
+            return
+        nextframe = self.nextFrame()
+        if nextframe is not None:
+            delay = max(self.frameTime(nextframe) - clock(), 0)
+            self.handle = self.loop.call_later(delay, self.step)
+
+    def step(self):
+        self.handle = None
+        self.ticking = True
+        try:
+            self.tick(max(self.currentFrame(), self.framenum))
+        finally:
+            self.ticking = False
+        self.reschedule()
+
+    def show(self):
+        # Only one write is in flight at a time; while the bus is busy the
+        # streams stay dirty and the newest frame goes out once it is free.
+        if self.writing is not None:
+            return
+        with self.framelock:
+            data = self.composeFrame().tobytes()
+            self.clean()
+        self.writing = self.loop.run_in_executor(self.executor, self.write, data)
+        self.writing.add_done_callback(self.written)
+
+    def written(self, future):
+        self.writing = None
+        self.reschedule()
+
+class StripController(threading.Thread, FrameClock):
+    # Runs the streams of several strips (one per output device) from a
+    # single scheduling thread. Every strip is rendered for a frame before
+    # any of them is written, so the outputs stay frame-synchronised.
+    # Strips added here must not be start()ed themselves.
+    def __init__(self, fps = 60):
+        threading.Thread.__init__(self)
+        self.setClock(fps)
+        self.strips = list()
+        self.wakeup = threading.Event()
+        self.name = "Strip Controller Thread"
+        self.dorun = True
+
+    def __getitem__(self, key):
+        return self.strips[key]
+
+    def __len__(self):
+        return len(self.strips)
+
+    def add(self, strip):
+        strip.setClock(self.fps, self.starttime)
+        # wakeups from any strip now land on the controller
+        strip.wakeup = self.wakeup
+        self.strips.append(strip)
+        self.notify()
+        return strip
+
+    def newstrip(self, num = 80, fname = '/dev/spidev0.0', pixel_size = 3):
+        return self.add(Strip(num, fname, pixel_size = pixel_size, fps = self.fps))
+
+    def nextFrame(self):
+        frames = [f for f in (strip.nextFrame() for strip in self.strips) if f is not None]
+        return min(frames) if frames else None
+
+    def isDirty(self):
+        for strip in self.strips:
+            if strip.isDirty():
+                return True
+        return False
+
+    def tick(self, frame):
+        for strip in self.strips:
+            strip.render(frame)
+        for strip in self.strips:
+            if strip.isDirty():
+                strip.show()
+
+    def run(self):
+        self.setClock(self.fps)
+        for strip in self.strips:
+            strip.setClock(self.fps, self.starttime)
+        while self.dorun:
+            frame = self.waitFrame()
+            if self.dorun:
+                self.tick(frame)
+
+    def stop(self):
+        self.dorun = False
+        self.wakeup.set()
+
+class Stream(object):
+    __slots__ = ('num_leds', 'pixel_size', 'pixnum', 'data', 'offset', 'array', 'temps',
+                 'parent', 'animqueue', 'scheduled', 'dirty', 'dirtylow', 'dirtyhigh',
+                 'rotation')
+
+    def __init__(self, num, parent, pixel_size = 3, view = None, offset = 0):
         self.num_leds = num
         self.pixel_size = pixel_size
         self.pixnum = num * self.pixel_size
-        self.data = bytearray(self.pixnum)
-        self.temps = self.data
+        if view is None:
+            view = memoryview(bytearray(self.pixnum))
+        self.setView(view)
+        self.offset = offset
+        self.temps = bytearray(self.pixnum)
         self.parent = parent
         self.animqueue = list()
+        self.scheduled = False
+        self.dirty = False
+        self.dirtylow = 0
+        self.dirtyhigh = 0
+        # data holds the stream rotated right by this many LEDs; it is
+        # undone when the frame is composed, so rotating costs nothing
+        self.rotation = 0
 
     def __add__(self, other):
-        return self.data + other
+        return self.getStream() + other
 
     def __radd__(self, other):
         if isinstance(other, int):
-            return self.data
+            return self.getStream()
         else:
-            return other + self.data
+            return other + self.getStream()
 
     def __len__(self):
         return len(self.data) / self.pixel_size
@@ -121,6 +811,20 @@ class Stream:
     def animate(self, animation):
         animation.setParent(self)
         self.animqueue.append(animation)
+        if self.parent is not None:
+            try:
+                self.parent.scheduleStream(self)
+            except RuntimeError:
+                self.animqueue.remove(animation)
+                raise
+
+    def setView(self, view):
+        # Move the stream onto view, which must already hold its pixels
+        self.data = view
+        # (num, pixel_size) array sharing memory with data, when available
+        self.array = None
+        if numpy is not None:
+            self.array = numpy.asarray(view).reshape(self.num_leds, self.pixel_size)
 
     def hasAnimation(self):
         return len(self.animqueue) > 0
@@ -134,22 +838,132 @@ class Stream:
     def removeAnim(self, animation):
         self.animqueue.remove(animation)
 
-    def getStream(self):
+    def markDirty(self, start = 0, end = None):
+        # start and end are byte offsets into this stream's data
+        if end is None:
+            end = self.pixnum
+        if self.dirty:
+            self.dirtylow = min(self.dirtylow, start)
+            self.dirtyhigh = max(self.dirtyhigh, end)
+        else:
+            self.dirty = True
+            self.dirtylow = start
+            self.dirtyhigh = end
+            if self.parent is not None:
+                self.parent.notify()
+
+    def clean(self):
+        self.dirty = False
+        self.dirtylow = 0
+        self.dirtyhigh = 0
+
+    def rotate(self, leds):
+        # Move every pixel leds places along (wrapping around) in O(1)
+        if self.num_leds:
+            self.setRotation((self.rotation + leds) % self.num_leds)
+            self.markDirty()
+
+    def setRotation(self, rotation):
+        if (rotation == 0) != (self.rotation == 0) and self.parent is not None:
+            self.parent.streamRotated(self, rotation)
+        self.rotation = rotation
+
+    def normalize(self):
+        # Apply the rotation to data, so data is in display order again
+        if self.rotation:
+            self.data[:] = self.getStream()
+            self.setRotation(0)
+
+    def copyTo(self, out):
+        # Write the stream into out in display order
+        if self.rotation:
+            split = (self.num_leds - self.rotation) * self.pixel_size
+            out[:self.pixnum - split] = self.data[split:]
+            out[self.pixnum - split:self.pixnum] = self.data[:split]
+        else:
+            out[:self.pixnum] = self.data
+
+    def logical(self):
+        # data in display order, copied only when the stream is rotated
+        if self.rotation:
+            return self.getStream()
         return self.data
 
+    def getStream(self):
+        out = bytearray(self.pixnum)
+        self.copyTo(out)
+        return out
+
+    def getArray(self):
+        self.normalize()
+        return self.array
+
     def getLED(self, led):
-        return self.data[n * self.pixel_size:(n * self.pixel_size) + self.pixel_size]
+        if self.rotation:
+            led = (led - self.rotation) % self.num_leds
+        return bytearray(self.data[led * self.pixel_size:(led * self.pixel_size) + self.pixel_size])
     
     def getNumLEDS(self):
         return self.num_leds
 
     def setStream(self, data):
-        self.data = data
+        self.data[:] = data
+        self.setRotation(0)
+        self.markDirty()
 
     def setLED(self, led, data):
         #print(int(data[0]), int(data[1]), int(data[2]))
-        self.data[led * self.pixel_size:(led * self.pixel_size) + self.pixel_size] = data[:]
+        start = led * self.pixel_size
+        if self.rotation:
+            pos = ((led - self.rotation) % self.num_leds) * self.pixel_size
+            self.data[pos:pos + self.pixel_size] = data
+        else:
+            self.data[start:start + self.pixel_size] = data
+        self.markDirty(start, start + self.pixel_size)
+
+    def setRange(self, start, stop, data):
+        # Set LEDs start to stop-1 from a buffer holding their pixels back
+        # to back, or from a single pixel repeated across the range
+        if stop <= start:
+            return
+        ps = self.pixel_size
+        if len(data) == ps and stop - start != 1:
+            data = bytearray(data) * (stop - start)
+        self.normalize()
+        self.data[start * ps:stop * ps] = data
+        self.markDirty(start * ps, stop * ps)
+
+    def setLEDs(self, leds, colors):
+        # Set many LEDs in one call. colors is a single pixel for all of
+        # them, a list with one pixel per LED or a buffer of all the pixels.
+        if len(leds) == 0:
+            return
+        ps = self.pixel_size
+        if isinstance(colors, list):
+            colors = bytearray().join(colors)
+        elif isinstance(colors, memoryview):
+            # bytes() of a memoryview is its repr on python 2
+            colors = colors.tobytes()
+        self.normalize()
+        if self.array is not None:
+            src = numpy.frombuffer(bytes(colors), dtype = numpy.uint8)
+            self.array[leds] = src if len(colors) == ps else src.reshape(-1, ps)
+        else:
+            data = self.data
+            if len(colors) == ps:
+                colors = bytes(colors)
+                for led in leds:
+                    data[led * ps:led * ps + ps] = colors
+            else:
+                view = memoryview(colors)
+                for i, led in enumerate(leds):
+                    data[led * ps:led * ps + ps] = view[i * ps:i * ps + ps]
+        self.markDirty(min(leds) * ps, max(leds) * ps + ps)
     
+    def precompile(self, animation, loop = False):
+        seq = precompile(animation, self.num_leds, self.getStream(), self.pixel_size)
+        return playback(seq, loop or animation.repeatsForever())
+
     def fill(self, colors):
         if not isinstance(colors, list):
             colors = [colors]
@@ -159,9 +973,15 @@ class Stream:
         d = d if d != 0 else 1
         perc = (self.num_leds / nc) + (nc / d)
         for x in xrange(nc):
-            b += (colors[x] * perc)
+            # a colour may be a whole buffer, so never build past the stream
+            n = min(perc, (self.pixnum - len(b)) / len(colors[x]) + 1)
+            b += (colors[x] * n)
+            if len(b) >= self.pixnum:
+                break
 
-        self.data = b[:self.pixnum]
+        self.data[:] = b[:self.pixnum]
+        self.setRotation(0)
+        self.markDirty()
 
     def pattern(self, pattern):
         if not isinstance(pattern, list):
@@ -172,37 +992,446 @@ class Stream:
         for b in pattern[1:]:
             a += b
         a = a * self.num_leds
-        self.data = a[:self.pixnum]
+        self.data[:] = a[:self.pixnum]
+        self.setRotation(0)
+        self.markDirty()
+
+    def off(self):
+        self.copyTo(self.temps)
+        self.data[:] = bytearray(self.pixnum)
+        self.setRotation(0)
+        self.markDirty()
+
+    def on(self):
+        self.setStream(self.temps)
+
+class Layer(Stream):
+    __slots__ = ('start', 'mode', 'opacity')
+
+    # A stream with a buffer of its own, blended over the strip's streams
+    # starting at LED `start`. See blend_layer() for the modes.
+    def __init__(self, num, parent, pixel_size = 3, start = 0, mode = 'alpha', opacity = 0.0):
+        if mode not in BLEND_MODES:
+            raise ValueError('Unknown blend mode %r' % (mode,))
+        Stream.__init__(self, num, parent, pixel_size, None, start * pixel_size)
+        self.start = start
+        self.mode = mode
+        self.opacity = opacity
+
+    def setMode(self, mode):
+        if mode not in BLEND_MODES:
+            raise ValueError('Unknown blend mode %r' % (mode,))
+        self.mode = mode
+        self.markDirty()
+
+    def setOpacity(self, opacity):
+        self.opacity = min(max(opacity, 0.0), 1.0)
+        self.markDirty()
+
+class Palette(object):
+    __slots__ = ('pixel_size', 'grow', 'table', 'array', 'lookup', 'nearby', 'size', 'channels',
+                 'streams')
+
+    # Up to 256 colours shared by IndexedStreams. Changing a colour changes
+    # every LED showing it, so cycling the palette animates them all. With
+    # grow = False colours are never added, only matched to the nearest.
+    def __init__(self, colors = None, pixel_size = 3, grow = True):
+        self.pixel_size = pixel_size
+        self.grow = grow
+        self.table = bytearray(256 * pixel_size)
+        self.array = None
+        if numpy is not None:
+            self.array = numpy.frombuffer(self.table, dtype = numpy.uint8).reshape(256, pixel_size)
+        # colour to its first index, and colours the palette could not
+        # take to the nearest one it has
+        self.lookup = dict()
+        self.nearby = dict()
+        self.size = 0
+        self.channels = None
+        self.streams = list()
+        if colors:
+            self.setColors(colors)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.getColor(index)
+
+    def __setitem__(self, index, color):
+        self.setColor(index, color)
+
+    def getColor(self, index):
+        ps = self.pixel_size
+        return bytes(self.table[index * ps:index * ps + ps])
+
+    def setColor(self, index, color):
+        self.setColors([color], index)
+
+    def setColors(self, colors, start = 0):
+        stop = start + len(colors)
+        if stop > 256:
+            raise ValueError('A palette holds at most 256 colours')
+        ps = self.pixel_size
+        old = [self.getColor(i) for i in xrange(start, min(stop, self.size))]
+        self.table[start * ps:stop * ps] = bytearray().join(colors)
+        self.size = max(self.size, stop)
+        self.relook(old, start, stop)
+        self.changed()
+
+    def index(self, color):
+        # Index of color. A colour the palette does not have is added while
+        # there is room, which no LED can be showing yet, so nothing is
+        # redrawn; once the palette is full it gets the nearest colour.
+        key = bytes(bytearray(color))
+        index = self.lookup.get(key)
+        if index is not None:
+            return index
+        if self.size == 256 or not self.grow:
+            return self.nearest(key)
+        index = self.size
+        ps = self.pixel_size
+        self.table[index * ps:index * ps + ps] = key
+        self.size += 1
+        self.lookup[key] = index
+        self.channels = None
+        return index
+
+    def nearest(self, key):
+        index = self.nearby.get(key)
+        if index is None:
+            if self.size == 0:
+                raise ValueError('Palette is empty')
+            color = bytearray(key)
+            if self.array is not None:
+                diff = self.array[:self.size].astype(numpy.int32) - numpy.array(color, dtype = numpy.int32)
+                index = int((diff * diff).sum(1).argmin())
+            else:
+                ps = self.pixel_size
+                table = self.table
+                index = min(xrange(self.size), key = lambda i:
+                            sum((table[i * ps + c] - color[c]) ** 2 for c in xrange(ps)))
+            self.nearby[key] = index
+        return index
+
+    def find(self, key):
+        # first index holding key, or None
+        ps = self.pixel_size
+        pos = self.table.find(key)
+        while pos != -1 and pos < self.size * ps:
+            if pos % ps == 0:
+                return pos / ps
+            pos = self.table.find(key, pos + 1)
+        return None
+
+    def relook(self, old, start, stop):
+        # Bring the lookup up to date for entries start to stop-1, which
+        # held the colours in old
+        lookup = self.lookup
+        for key in old:
+            if start <= lookup.get(key, -1) < stop:
+                del lookup[key]
+                index = self.find(key)
+                if index is not None:
+                    lookup[key] = index
+        for i in xrange(start, stop):
+            key = self.getColor(i)
+            if lookup.get(key, 256) > i:
+                lookup[key] = i
+
+    def rotate(self, steps = 1, start = 0, stop = None):
+        # Cycle colours start to stop-1 steps places along
+        if stop is None:
+            stop = self.size
+        count = stop - start
+        if count <= 0:
+            return
+        ps = self.pixel_size
+        steps = (steps % count) * ps
+        if steps:
+            old = [self.getColor(i) for i in xrange(start, stop)]
+            part = self.table[start * ps:stop * ps]
+            self.table[start * ps:stop * ps] = part[-steps:] + part[:-steps]
+            self.relook(old, start, stop)
+        self.changed()
+
+    def changed(self):
+        # redraw every stream using the palette
+        self.nearby = dict()
+        self.channels = None
+        for stream in self.streams:
+            stream.markDirty()
+
+    def expand(self, indices, out):
+        # Look every index up in one pass, writing the pixels to out
+        if self.array is not None:
+            numpy.take(self.array, toarray(indices), axis = 0, out = toarray(out).reshape(-1, self.pixel_size))
+            return out
+        ps = self.pixel_size
+        if self.channels is None:
+            self.channels = [bytes(self.table[c::ps]) for c in xrange(ps)]
+        if isinstance(indices, memoryview):
+            indices = indices.tobytes()
+        pixels = bytearray(len(indices) * ps)
+        for c in xrange(ps):
+            pixels[c::ps] = indices.translate(self.channels[c])
+        out[:] = pixels
+        return out
+
+class IndexedStream(Stream):
+    __slots__ = ('palette', 'indices', 'indexview')
+
+    # Stores one byte per LED, an index into palette, instead of a pixel.
+    # Colours given to it are looked up in (or added to) the palette, and
+    # the pixels in data are only filled in from the indices when the
+    # frame is shown. Rotation moves the indices themselves. data is the
+    # stream's window of the strip's frame, so it costs nothing extra, but
+    # a stream made outside a strip has a pixel buffer of its own.
+    def __init__(self, num, parent, palette, view = None, offset = 0):
+        Stream.__init__(self, num, parent, palette.pixel_size, view, offset)
+        self.palette = palette
+        self.indices = bytearray(num)
+        self.indexview = memoryview(self.indices)
+        self.temps = None
+        palette.streams.append(self)
+
+    def toIndices(self, data):
+        # An index, a pixel or a buffer of pixels, as a buffer of indices
+        if isinstance(data, (int, long)):
+            return bytearray([data])
+        ps = self.pixel_size
+        data = bytearray(data)
+        if len(data) == ps:
+            return bytearray([self.palette.index(data)])
+        return bytearray([self.palette.index(data[i:i + ps]) for i in xrange(0, len(data), ps)])
+
+    def expand(self, start = 0, stop = None):
+        # Fill in data for LEDs start to stop-1 (by default the dirty range)
+        ps = self.pixel_size
+        if stop is None:
+            start = self.dirtylow / ps
+            stop = (self.dirtyhigh + ps - 1) / ps
+        if stop > start:
+            self.palette.expand(self.indexview[start:stop], self.data[start * ps:stop * ps])
+
+    def getIndices(self):
+        return bytearray(self.indices)
+
+    def setIndices(self, indices, start = 0):
+        self.indices[start:start + len(indices)] = indices
+        self.markDirty(start * self.pixel_size, (start + len(indices)) * self.pixel_size)
+
+    def getStream(self):
+        out = bytearray(self.pixnum)
+        self.palette.expand(self.indexview, out)
+        return out
+
+    def logical(self):
+        return self.getStream()
+
+    def copyTo(self, out):
+        self.palette.expand(self.indexview, out[:self.pixnum])
+
+    def normalize(self):
+        return
+
+    def getLED(self, led):
+        return bytearray(self.palette.getColor(self.indices[led]))
+
+    def rotate(self, leds):
+        if self.num_leds:
+            leds %= self.num_leds
+            if leds:
+                self.indices[:] = self.indices[-leds:] + self.indices[:-leds]
+            self.markDirty()
+
+    def setStream(self, data):
+        # a buffer of indices, or of pixels
+        if len(data) == self.num_leds:
+            self.indices[:] = data
+        else:
+            self.indices[:] = self.toIndices(data)
+        self.markDirty()
+
+    def setLED(self, led, data):
+        self.indices[led] = self.toIndices(data)[0]
+        self.markDirty(led * self.pixel_size, (led + 1) * self.pixel_size)
+
+    def setRange(self, start, stop, data):
+        if stop <= start:
+            return
+        indices = self.toIndices(data)
+        if len(indices) == 1:
+            indices = indices * (stop - start)
+        self.setIndices(indices, start)
+
+    def setLEDs(self, leds, colors):
+        if len(leds) == 0:
+            return
+        if isinstance(colors, list):
+            indices = bytearray().join(self.toIndices(c) for c in colors)
+        else:
+            indices = self.toIndices(colors)
+        if len(indices) == 1:
+            for led in leds:
+                self.indices[led] = indices[0]
+        else:
+            for i, led in enumerate(leds):
+                self.indices[led] = indices[i]
+        ps = self.pixel_size
+        self.markDirty(min(leds) * ps, max(leds) * ps + ps)
+
+    def fill(self, colors):
+        if not isinstance(colors, list):
+            colors = [colors]
+        # the same blocks of colours Stream.fill() makes
+        b = bytearray()
+        nc = len(colors)
+        d = (self.num_leds % nc)
+        d = d if d != 0 else 1
+        perc = (self.num_leds / nc) + (nc / d)
+        for x in xrange(nc):
+            c = self.toIndices(colors[x])
+            b += c * min(perc, (self.num_leds - len(b)) / len(c) + 1)
+            if len(b) >= self.num_leds:
+                break
+        self.indices[:] = b[:self.num_leds]
+        self.markDirty()
+
+    def pattern(self, pattern):
+        if not isinstance(pattern, list):
+            pattern = [pattern]
+        a = bytearray().join(self.toIndices(p) for p in pattern) * self.num_leds
+        self.indices[:] = a[:self.num_leds]
+        self.markDirty()
 
     def off(self):
-        self.temps = self.data
-        self.data = bytearray(self.pixnum)
+        self.temps = bytearray(self.indices)
+        self.fill(bytearray(self.pixel_size))
 
     def on(self):
-        self.data = self.temps
+        if self.temps is not None:
+            self.setStream(self.temps)
 
 gamma = bytearray(256)
-for i in range(256):
-    gamma[i] = i#int(pow(float(i) / 255.0, 1.5) * 255.0)
+gamma_curve = 1.0
+
+# brightness_tables[level][value] == gamma[int(value * level / 255)], built
+# lazily one level at a time and thrown away whenever the curve changes.
+brightness_tables = [None] * 256
+
+def setGamma(curve = 1.0):
+    global gamma_curve
+    gamma_curve = curve
+    for i in range(256):
+        gamma[i] = int(pow(float(i) / 255.0, curve) * 255.0 + 0.5)
+    for i in range(256):
+        brightness_tables[i] = None
+
+setGamma(gamma_curve)
+
+def brightness_table(brightness):
+    level = int(brightness * 255 + 0.5)
+    level = 0 if level < 0 else 255 if level > 255 else level
+    table = brightness_tables[level]
+    if table is None:
+        table = bytes(bytearray([gamma[(v * level) / 255] for v in range(256)]))
+        brightness_tables[level] = table
+    return table
+
+def toarray(data):
+    if isinstance(data, memoryview):
+        return numpy.asarray(data)
+    return numpy.frombuffer(data, dtype = numpy.uint8)
+
+def filter_stream(data, brightness, out = None):
+    # Scale every byte of data by brightness and pass it through gamma.
+    # Unlike the old filter_pixel, data is left untouched.
+    if out is None:
+        out = bytearray(len(data))
+    table = brightness_table(brightness)
+    if numpy is not None:
+        numpy.take(numpy.frombuffer(table, dtype = numpy.uint8), toarray(data), out = toarray(out))
+    else:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        out[:] = data.translate(table)
+    return out
+
+def blend_stream(a, b, amount, out = None):
+    # Mix from a (amount 0.0) to b (amount 1.0), byte for byte
+    if out is None:
+        out = bytearray(len(a))
+    if numpy is not None:
+        x = toarray(a).astype(numpy.float32)
+        x += (toarray(b) - x) * amount
+        toarray(out)[:] = x.astype(numpy.uint8)
+    else:
+        # memoryview items are strings on Python 2, so work on copies
+        a = bytearray(a)
+        b = bytearray(b)
+        mixed = bytearray(len(a))
+        for i in xrange(len(a)):
+            mixed[i] = int(a[i] + (b[i] - a[i]) * amount)
+        out[:] = mixed
+    return out
+
+BLEND_MODES = ('alpha', 'add', 'max', 'multiply')
+
+def blend_layer(base, layer, mode = 'alpha', opacity = 1.0):
+    # Blend layer over base in place. alpha mixes towards the layer by
+    # opacity; add, max and multiply combine with the layer scaled by it.
+    if mode == 'alpha':
+        return blend_stream(base, layer, opacity, base)
+    if mode not in BLEND_MODES:
+        raise ValueError('Unknown blend mode %r' % (mode,))
+    if numpy is not None:
+        b = toarray(base)
+        l = toarray(layer).astype(numpy.float32)
+        if mode == 'add':
+            l *= opacity
+            l += b
+            numpy.minimum(l, 255, l)
+        elif mode == 'max':
+            l *= opacity
+            numpy.maximum(l, b, l)
+        else:
+            l *= opacity / 255.0
+            l += 1.0 - opacity
+            l *= b
+        b[:] = l.astype(numpy.uint8)
+    else:
+        b = bytearray(base)
+        l = bytearray(layer)
+        for i in xrange(len(b)):
+            if mode == 'add':
+                b[i] = min(int(b[i] + l[i] * opacity), 255)
+            elif mode == 'max':
+                b[i] = max(b[i], int(l[i] * opacity))
+            else:
+                b[i] = int(b[i] * (1.0 - opacity + opacity * l[i] / 255.0))
+        base[:] = b
+    return base
 
 def filter_pixel(input_pixel, brightness):
-    output_pixel = bytearray(3)
-    input_pixel[0] = int(brightness * input_pixel[0])
-    input_pixel[1] = int(brightness * input_pixel[1])
-    input_pixel[2] = int(brightness * input_pixel[2])
-    output_pixel[0] = gamma[input_pixel[0]]
-    output_pixel[1] = gamma[input_pixel[1]]
-    output_pixel[2] = gamma[input_pixel[2]]
-    return output_pixel
+    return bytearray(input_pixel[:3]).translate(brightness_table(brightness))
+
 
+class Animation(object):
+    __slots__ = ('__initialized', '__running', '__finished', '__parent', '__frame',
+                 '__wakeframe')
+
+    # Animations that render the same frames for the same parameters and
+    # starting buffer can have their output cached by precompile()
+    deterministic = True
 
-class Animation:
     def __init__(self):
         self.__initialized = False
         self.__running = False
         self.__finished = False
         self.__parent = None
-        self.__timer = 0
+        self.__frame = 0
+        self.__wakeframe = 0
 
     def setParent(self, parent):
         self.__parent = parent
@@ -232,6 +1461,18 @@ class Animation:
     def setLED(self, led, data):
         if self.__parent != None:
             self.__parent.setLED(led, data)
+
+    def setLEDs(self, leds, colors):
+        if self.__parent != None:
+            self.__parent.setLEDs(leds, colors)
+
+    def setRange(self, start, stop, data):
+        if self.__parent != None:
+            self.__parent.setRange(start, stop, data)
+
+    def rotate(self, leds):
+        if self.__parent != None:
+            self.__parent.rotate(leds)
     
     def fill(self, colors):
         if self.__parent != None:
@@ -275,9 +1516,13 @@ class Animation:
 
 
 
-    def _run(self):
-        if self.__timer - 1 > -1:
-            self.__timer -= 1
+    def _run(self, frame = None):
+        # frame is the scheduler frame number; when driven by hand without
+        # one, every call counts as the next frame.
+        if frame is None:
+            frame = self.__frame + 1
+        self.__frame = frame
+        if frame < self.__wakeframe:
             return
         self.run()
         #self.__runloop()
@@ -291,16 +1536,19 @@ class Animation:
         #self._run()
 
 
-    def start(self):
+    def start(self, frame = None):
         #self.__bootstrap()
+        if frame is None:
+            frame = self.__frame + 1
+        self.__frame = frame
         self._init()
-        self._run()
+        self._run(frame)
 
     def reset(self):
         self.__initialized = False
         self.__running = False
         self.__finished = False
-        self.__timer = 0
+        self.__wakeframe = 0
         return
 
     def isFirstRun(self):
@@ -315,10 +1563,49 @@ class Animation:
     def isRunning(self):
         return self.__running
 
+    def advance(self, frame):
+        # One scheduler step: start or run the animation at frame and return
+        # the frame it next needs to run on, or None once it has finished.
+        if not self.__initialized:
+            self.start(frame)
+        else:
+            self._run(frame)
+        if self.__finished:
+            return None
+        return max(self.getWakeFrame(), frame + 1)
+
+    def getFrame(self):
+        return self.__frame
+
+    def getWakeFrame(self):
+        return max(self.__wakeframe, self.__frame + 1)
+
     def sleep(self, cycles):
-        self.__timer = cycles
+        # skip the next `cycles` frames
+        self.__wakeframe = self.__frame + cycles + 1
+
+    def repeatsForever(self):
+        return False
+
+    def cacheKey(self):
+        # Built from public attributes, so it describes the animation as
+        # constructed; call it before the animation first runs.
+        items = [(k, repr(v)) for k, v in self.publicAttributes()]
+        return (self.__class__.__name__, tuple(items))
+
+    def publicAttributes(self):
+        # (name, value) pairs of every set public attribute, slotted or not
+        attrs = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if not name.startswith('_') and hasattr(self, name):
+                    attrs[name] = getattr(self, name)
+        return sorted((k, v) for k, v in attrs.items() if not k.startswith('_'))
 
 class AnimationGroup(Animation):
+    __slots__ = ('animations', 'noanim', 'canim', '__size', '__repeat', '__repeats',
+                 '__infinite_repeat', '__current_index')
+
     def __init__(self):
         Animation.__init__(self)
         self.animations = list()
@@ -360,6 +1647,12 @@ class AnimationGroup(Animation):
         self.__repeats = 0
         self.__infinite_repeat = infinite
 
+    def getRepeat(self):
+        return (self.__repeat, self.__infinite_repeat)
+
+    def repeatsForever(self):
+        return self.__infinite_repeat
+
     def haveAnimations(self):
         #print(self.__size)
         return self.__current_index < self.__size
@@ -367,6 +1660,26 @@ class AnimationGroup(Animation):
     def getAnimation(self):
         return self.animations[self.__current_index]
 
+    @property
+    def deterministic(self):
+        # a group is only as repeatable as everything in it
+        for animation in self.animations:
+            if not animation.deterministic:
+                return False
+        return True
+
+    def cacheKey(self):
+        items = [(k, repr(v)) for k, v in self.publicAttributes() if k != 'animations']
+        children = tuple(a.cacheKey() for a in self.animations)
+        return (self.__class__.__name__, tuple(items), children,
+                self.__repeat, self.__infinite_repeat)
+
+    def getWakeFrame(self):
+        wake = Animation.getWakeFrame(self)
+        if self.haveAnimations() and not self.noanim:
+            wake = max(wake, self.canim.getWakeFrame())
+        return wake
+
     def init(self):
         self.__current_index = 0
         self.noanim = True
@@ -377,9 +1690,9 @@ class AnimationGroup(Animation):
                 self.canim = self.getAnimation()
                 self.noanim = False
                 if self.canim.isFirstRun():
-                    self.canim.start()
+                    self.canim.start(self.getFrame())
             else:
-                self.canim._run()
+                self.canim._run(self.getFrame())
                 
         if self.canim.isFinished():
             self.__current_index += 1
@@ -394,7 +1707,46 @@ class AnimationGroup(Animation):
                     self.finished()
         return
 
+class GeneratedAnimation(Animation):
+    __slots__ = ('generator',)
+
+    # An animation written as a generator instead of a state machine.
+    # Subclasses implement frames(); everything up to a yield happens in
+    # one frame, and what is yielded says when to continue:
+    #   None or 0       - the next frame
+    #   n               - after skipping n frames, like sleep(n)
+    #   a frame buffer  - setStream() it, then the next frame
+    # The animation finishes on the frame where frames() returns.
+    def __init__(self):
+        Animation.__init__(self)
+        self.generator = None
+
+    def frames(self):
+        return
+        yield
+
+    def reset(self):
+        Animation.reset(self)
+        self.generator = None
+
+    def run(self):
+        if self.generator is None:
+            self.generator = self.frames()
+        try:
+            value = self.generator.next()
+        except StopIteration:
+            self.generator = None
+            self.finished()
+            return
+        if value:
+            if isinstance(value, (int, long)):
+                self.sleep(value)
+            else:
+                self.setStream(value)
+
 class fill(Animation):
+    __slots__ = ('colors',)
+
     def __init__(self, colors):
         Animation.__init__(self)
         self.colors = colors
@@ -406,6 +1758,8 @@ class fill(Animation):
         return
 
 class pattern(Animation):
+    __slots__ = ('colors',)
+
     def __init__(self, colors):
         Animation.__init__(self)
         self.colors = colors
@@ -416,95 +1770,57 @@ class pattern(Animation):
         self.finished()
         return
 
-class pulse(Animation):
+class pulse(GeneratedAnimation):
+    __slots__ = ('maxcycles', 'maxsteps', 'wait')
+
     def __init__(self, cycles = 1, steps = 15, wait = 0):
-        Animation.__init__(self)
+        GeneratedAnimation.__init__(self)
 
         self.maxcycles = cycles
         self.maxsteps = steps
         self.wait = wait
         return
 
-    def init(self):
-        self.cycles = iter(xrange(self.maxcycles))
-        self.c = self.getStream()
-        self.state = 0
-        self.step = 1.0/float(self.maxsteps)
-        self.r = [(q * 3) for q in xrange(len(self.c)/3)]
-        return
+    def frames(self):
+        c = self.getStream()
+        b = bytearray(len(c))
+        step = 1.0/float(self.maxsteps)
 
-    def run(self):
+        for cycle in xrange(self.maxcycles):
+            for y in xrange(self.maxsteps):
+                filter_stream(c, 1 - ((y + 1) * step), b)
+                self.setStream(b)
+                yield self.wait
 
-        if self.state == 0:
-            self.z = iter(xrange(self.maxsteps))
-            self.b = bytearray(len(self.c))
-            self.state = 1
-
-        if self.state == 1:
-            y = self.z.next()
-            for i in self.r:
-                self.b[i:i + 3] = filter_pixel(self.c[i:i + 3], 1 - ((y + 1) * self.step))
-            self.setStream(self.b)
-
-            if y + 1 == self.maxsteps:
-                self.z = iter(xrange(self.maxsteps))
-                self.state = 2
-
-        elif self.state == 2:
-            y = self.z.next()
-            for i in self.r:
-                self.b[i:i + 3] = filter_pixel(self.c[i:i + 3], (y + 1) * self.step)
-            self.setStream(self.b)
-
-            if y + 1 == self.maxsteps:
-                #self.setStream(self.c)
-                #self.z = iter(xrange(self.maxsteps))
-                self.state = 3
-
-        if self.state == 3:
-            if self.cycles.next() + 1 == self.maxcycles:
-                self.finished()
-            else:
-                self.state = 0
-        self.sleep(self.wait)
-                
-        return
+            for y in xrange(self.maxsteps):
+                filter_stream(c, (y + 1) * step, b)
+                self.setStream(b)
+                if y + 1 < self.maxsteps or cycle + 1 < self.maxcycles:
+                    yield self.wait
 
 
-class flash(Animation):
+class flash(GeneratedAnimation):
+    __slots__ = ('maxcycles', 'wait')
+
     def __init__(self, cycles = 1, wait = 10):
-        Animation.__init__(self)
+        GeneratedAnimation.__init__(self)
         self.maxcycles = cycles * 2
         self.wait = wait
         return
 
-    def init(self):
-        self.cycles = iter(xrange(self.maxcycles))
-        self.c = self.getStream()
-        self.clear = bytearray(len(self.c))
-        self.state = 0
-        return
+    def frames(self):
+        c = self.getStream()
+        clear = bytearray(len(c))
 
-    def run(self):
-        s = self.cycles.next() + 1
-
-        if self.state == 0:
-            self.setStream(self.clear)
-            self.state = 1
-
-        elif self.state == 1:
-            self.setStream(self.c)
-            self.state = 0
-
-        if s == self.maxcycles:
-            self.finished()
-        else:
-            self.sleep(self.wait)
-
-        return
+        for s in xrange(1, self.maxcycles + 1):
+            self.setStream(clear if s % 2 else c)
+            if s < self.maxcycles:
+                yield self.wait
 
 
 class sweep(Animation):
+    __slots__ = ('colors', 'db', 'f', 't', 'd', 'wait', 'first_run', 'x', 'lenx', 'a', '_i')
+
     def __init__(self, colors, doubleBack = True, frm = 0, to = None, direction = 1, wait = 10):
         Animation.__init__(self)
         
@@ -569,11 +1885,14 @@ class sweep(Animation):
         return
 
 class centerSweep(Animation):
+    __slots__ = ('colors', 'of', 'wait', 'first_run', 'a', 'b', 'k', 'lenx', '_i')
+
     def __init__(self, colors, reverse = False, wait = 2):
         Animation.__init__(self)
         if not isinstance(colors, list):
             colors = [colors]
 
+        self.colors = colors
         self.of = reverse
         self.wait = wait
 
@@ -602,7 +1921,7 @@ class centerSweep(Animation):
             self.first_run = False
 
         k = -1
-        b = range(len(self.a/2) + (self.getNumLEDS()%2))
+        b = range(len(self.a)/2)
         colors = self.colors
         clen = len(colors)
 
@@ -610,7 +1929,8 @@ class centerSweep(Animation):
             k = k + 1 if k + 1 < clen else 0
             b[d] = colors[k]
 
-        self.lenx = len(self.a) - 1
+        self.lenx = len(b)
+        self.k = 0
         if self.of:
             self._i = reversed(self.a)
             self.b = b
@@ -619,34 +1939,34 @@ class centerSweep(Animation):
             self.b = b[::-1]
 
     def run(self):
-        i = self._i.next()
-        color = self.b[i]
-        self.setLED(i, color)
-        i = self._i.next()
-        self.setLED(i, color)
+        # LEDs are lit in pairs, one colour per pair
+        color = self.b[self.k]
+        self.setLED(self._i.next(), color)
+        self.setLED(self._i.next(), color)
+        self.k += 1
 
-        if i == self.lenx:
+        if self.k == self.lenx:
             self.finished()
 
         self.sleep(self.wait)
 
 class shift(Animation):
+    __slots__ = ('step', 'maxcycles', 'wait', 'cycles')
+
     def __init__(self, step = 1, cycles = 1, wait = 0):
         Animation.__init__(self)
-        self.step = -step
+        self.step = step
         self.maxcycles = cycles
         self.wait = wait
 
     def init(self):
         self.cycles = iter(xrange(self.maxcycles))
-        self.d = self.getStream()
         return
 
     def run(self):
         s = self.cycles.next() + 1
 
-        self.d = self.d[self.step * 3:] + self.d[:self.step * 3]
-        self.setStream(self.d)
+        self.rotate(self.step)
 
         if s == self.maxcycles:
             self.finished()
@@ -654,72 +1974,62 @@ class shift(Animation):
             self.sleep(self.wait)
         return
 
-class colorfade(Animation):
-    def __init__(self, colors, wait = 0):
-        Animation.__init__(self)
+# entries per fade in colorfade's gradient table
+FADE_STEPS = 256
+
+class colorfade(GeneratedAnimation):
+    __slots__ = ('colors', 'wait', 'duration', 'curve', 'space')
+
+    # Fades through colors, each fade lasting duration frames and eased by
+    # curve (see gradient.EASINGS). Without a duration a fade lasts as many
+    # updates as its largest channel change, one every wait + 1 frames.
+    def __init__(self, colors, wait = 0, duration = None, curve = 'linear', space = 'rgb'):
+        GeneratedAnimation.__init__(self)
         if not isinstance(colors, list):
             raise TypeError('First Argument must be a list of colors')
 
         self.colors = colors
         self.wait = wait
+        self.duration = duration
+        self.curve = curve
+        self.space = space
         return
 
-    def init(self):
-        self.d = bytearray(self.colors[0])
-        self.colorcycle = enumerate(iter(self.colors))
-        self.state = 0
-        return
-
-    def run(self):
-        if self.state == 0:
-            self.ncolor, self.ccolor = self.colorcycle.next()
-            self.ncolor += 1
-            self.rdif = abs(self.ccolor[0] - self.d[0])
-            self.gdif = abs(self.ccolor[1] - self.d[1])
-            self.bdif = abs(self.ccolor[2] - self.d[2])
-
-            self.rd = 1 if (self.ccolor[0] > self.d[0]) else -1
-            self.gd = 1 if (self.ccolor[1] > self.d[1]) else -1
-            self.bd = 1 if (self.ccolor[2] > self.d[2]) else -1
-
-            self.state = 1
-
-        if self.state == 1:
-            if self.rdif != 0 or self.gdif != 0 or self.bdif != 0:
-                if self.rdif != 0:
-                    self.d[0] += self.rd
-                    self.rdif -= 1
-                
-                if self.gdif != 0:
-                    self.d[1] += self.gd
-                    self.gdif -= 1
-
-                if self.bdif != 0:
-                    self.d[2] += self.bd
-                    self.bdif -= 1
-            
-            else:
-                self.state = 0
-
-            self.fill(self.d)
-
-
-
-        if self.ncolor == len(self.colors):
-            self.finished()
-        else:
-            self.sleep(self.wait)
-        
-        return
+    def frames(self):
+        # The colour is looked up by the frames elapsed since the fade
+        # began, so a fade keeps its length even when frames are dropped
+        table = gradient(self.colors, FADE_STEPS, self.curve, self.space)
+        ps = len(self.colors[0])
+        self.fill(bytes(bytearray(self.colors[0])))
+
+        for i in xrange(len(self.colors) - 1):
+            a = bytearray(self.colors[i])
+            b = bytearray(self.colors[i + 1])
+            duration = self.duration
+            if duration is None:
+                duration = max(abs(x - y) for x, y in zip(a, b)) * (self.wait + 1)
+            start = self.getFrame()
+            base = i * FADE_STEPS
+            pos = 0
+            while pos < duration:
+                yield self.wait
+                pos = self.getFrame() - start
+                if pos < duration:
+                    k = (base + pos * FADE_STEPS / duration) * ps
+                    self.fill(table[k:k + ps])
+                else:
+                    self.fill(bytes(b))
 
 class burstSweep(AnimationGroup):
+    __slots__ = ('colors', 'direction', 'wait', 'first_run')
+
     def __init__(self, colors, cycles = 1, direction = 1, wait = 5):
         AnimationGroup.__init__(self)
 
         if not isinstance(colors, list):
             colors = [colors]
 
-        self.color = color
+        self.colors = colors
         self.direction = direction
         self.wait = wait
         self.repeat(cycles)
@@ -732,13 +2042,17 @@ class burstSweep(AnimationGroup):
        
         for c in self.colors:
             darkColor = filter_pixel(c, 0.7)
-            self.add(LED.fill(colors = bytarray(c) + (darkColor * (self.getNumLEDS() - 2))))
-            self.add(LED.shift(step = self.direction, cycles = self.getNumLEDS(), wait = self.wait))
-            self.add(LED.shift(step = -1 * self.direction, cycles = self.getNumLEDS(), wait = self.wait))
+            self.add(fill(colors = bytearray(c) + (darkColor * (self.getNumLEDS() - 1))))
+            self.add(shift(step = self.direction, cycles = self.getNumLEDS(), wait = self.wait))
+            self.add(shift(step = -1 * self.direction, cycles = self.getNumLEDS(), wait = self.wait))
 
 
 class wave(AnimationGroup):
-    def __init__(self, colors, cycles = 1, wait = 5):
+    __slots__ = ('colors', 'cycles', 'wait', 'curve', 'space')
+
+    deterministic = False
+
+    def __init__(self, colors, cycles = 1, wait = 5, curve = 'linear', space = 'rgb'):
         AnimationGroup.__init__(self)
         if not isinstance(colors, list):
             colors = [colors, colors]
@@ -746,6 +2060,8 @@ class wave(AnimationGroup):
         self.cycles = cycles
         self.colors = colors
         self.wait = wait
+        self.curve = curve
+        self.space = space
 
     def init(self):
         AnimationGroup.init(self)
@@ -757,32 +2073,12 @@ class wave(AnimationGroup):
         steps = self.getNumLEDS() / len(self.colors)
         steps = [steps for _ in self.colors]
         steps[randint(0, len(steps)-1)] += (self.getNumLEDS() % len(self.colors))
-        
-        rd = []
-        gd = []
-        bd = []
-
-        for i, c in enumerate(self.colors[:-1]):
-            rdif = abs(c[0] - self.colors[i+1][0]) * 1.0
-            gdif = abs(c[1] - self.colors[i+1][1]) * 1.0
-            bdif = abs(c[2] - self.colors[i+1][2]) * 1.0
-            rd.append(((1 if (c[0] < self.colors[i+1][0]) else -1) * rdif) / steps[i])
-            gd.append(((1 if (c[1] < self.colors[i+1][1]) else -1) * gdif) / steps[i])
-            bd.append(((1 if (c[2] < self.colors[i+1][2]) else -1) * bdif) / steps[i])
-
-        rdif = abs(self.colors[-1][0] - self.colors[0][0]) * 1.0
-        gdif = abs(self.colors[-1][1] - self.colors[0][1]) * 1.0
-        bdif = abs(self.colors[-1][2] - self.colors[0][2]) * 1.0
-        rd.append(((1 if (self.colors[-1][0] < self.colors[0][0]) else -1) * rdif) / steps[-1])
-        gd.append(((1 if (self.colors[-1][1] < self.colors[0][1]) else -1) * gdif) / steps[-1])
-        bd.append(((1 if (self.colors[-1][2] < self.colors[0][2]) else -1) * bdif) / steps[-1])
-
-        colors = list()
-
-        for x, c in enumerate(self.colors):
-            colors += [[int(c[0] + rd[x] * i),
-                        int(c[1] + gd[x] * i),
-                        int(c[2] + bd[x] * i)] for i in xrange(steps[x])]
+
+        # one pixel per LED, each colour blending into the next and the last
+        # back into the first
+        table = gradient(self.colors, steps, self.curve, self.space, cyclic = True)
+        ps = len(self.colors[0])
+        colors = [table[i:i + ps] for i in xrange(0, len(table), ps)]
 
         start = randint(0, len(colors)-1)
         colors = colors[start:] + colors[:start]
@@ -791,9 +2087,151 @@ class wave(AnimationGroup):
 
 
 class wait(Animation):
+    __slots__ = ('wait',)
+
     def __init__(self, wait):
         Animation.__init__(self)
         self.wait = wait
     def init(self):
         self.sleep(self.wait)
-    
\ No newline at end of file
+
+
+class FrameSequence:
+    # The frames an animation produced, stored back to back in one bytes
+    # object. frames[i] is the frame number the i-th buffer was shown on;
+    # length is the frame the animation finished on.
+    def __init__(self, num_leds, pixel_size, data, frames, length):
+        self.num_leds = num_leds
+        self.pixel_size = pixel_size
+        self.pixnum = num_leds * pixel_size
+        self.data = data
+        self.frames = frames
+        self.length = length
+
+    def __len__(self):
+        return len(self.frames)
+
+    def getFrame(self, index):
+        return memoryview(self.data)[index * self.pixnum:(index + 1) * self.pixnum]
+
+class FrameCache:
+    def __init__(self, size = 32):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        seq = self.entries.pop(key, None)
+        if seq is not None:
+            self.entries[key] = seq
+        return seq
+
+    def put(self, key, seq):
+        self.entries.pop(key, None)
+        self.entries[key] = seq
+        while len(self.entries) > self.size:
+            self.entries.popitem(last = False)
+
+    def clear(self):
+        self.entries.clear()
+
+frame_cache = FrameCache()
+
+def precompile(animation, num_leds, start = None, pixel_size = 3, maxframes = 1000000,
+               cache = frame_cache, maxbytes = 64 * 1024 * 1024):
+    # Run animation headless against a stream of num_leds holding start and
+    # record every frame it changes. An infinitely repeating group is
+    # compiled for one pass, which playback with loop = True repeats the way
+    # the group would. Anything else that runs past maxframes, or records
+    # more than maxbytes, raises.
+    if start is None:
+        start = bytearray(num_leds * pixel_size)
+    key = None
+    if cache is not None and animation.deterministic:
+        key = (animation.cacheKey(), num_leds, pixel_size, bytes(bytearray(start)))
+        seq = cache.get(key)
+        if seq is not None:
+            return seq
+
+    stream = Stream(num_leds, None, pixel_size)
+    stream.setStream(start)
+    stream.clean()
+    animation.setParent(stream)
+
+    forever = animation.repeatsForever()
+    if forever:
+        cycles, infinite = animation.getRepeat()
+        animation.repeat(0)
+
+    data = bytearray()
+    frames = list()
+    frame = 0
+    try:
+        while True:
+            wake = animation.advance(frame)
+            if stream.dirty:
+                data += stream.logical()
+                frames.append(frame)
+                stream.clean()
+                if len(data) > maxbytes:
+                    raise RuntimeError('Animation recorded more than %d bytes' % maxbytes)
+            if wake is None:
+                break
+            frame = wake
+            if frame > maxframes:
+                raise RuntimeError('Animation did not finish within %d frames' % maxframes)
+    finally:
+        animation.reset()
+        if forever:
+            animation.repeat(cycles, infinite)
+
+    seq = FrameSequence(num_leds, pixel_size, bytes(data), frames, frame)
+    if key is not None:
+        cache.put(key, seq)
+    return seq
+
+class playback(Animation):
+    __slots__ = ('sequence', 'loop', 'index')
+
+    def __init__(self, sequence, loop = False):
+        Animation.__init__(self)
+        self.sequence = sequence
+        self.loop = loop
+
+    def init(self):
+        self.index = 0
+        frames = self.sequence.frames
+        if frames and frames[0] > 0:
+            self.sleep(frames[0] - 1)
+        elif not frames and self.sequence.length > 0:
+            self.sleep(self.sequence.length - 1)
+
+    def run(self):
+        seq = self.sequence
+        frames = seq.frames
+
+        if self.index >= len(frames):
+            if not self.loop or not frames:
+                self.finished()
+                return
+            self.index = 0
+            if frames[0] > 0:
+                self.sleep(frames[0] - 1)
+                return
+
+        current = frames[self.index]
+        self.setStream(seq.getFrame(self.index))
+        self.index += 1
+
+        if self.index < len(frames):
+            self.sleep(frames[self.index] - current - 1)
+        elif self.loop:
+            # the next pass starts the frame after the last one ended,
+            # as it does when a group repeats
+            self.sleep(seq.length - current)
+        elif seq.length > current:
+            self.sleep(seq.length - current - 1)
+        else:
+            self.finished()
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+
+#####################################
+# benchmark.py                      #
+# Author: noriah                    #
+# Frame rate benchmarks for PyLED   #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+# Runs every animation headless against a NullOutput and reports frames per
+# second, per-frame latency percentiles and the net number of gc-tracked
+# objects each frame leaves behind.
+#
+#   python benchmark.py --sizes 32 1000 --frames 200 --json
+#
+# --streams 20 --workers 4 splits each strip into 20 streams rendered by
+# four worker processes. --spi 4096 writes through SpiOutput to a fake
+# spidev device with that bufsiz and checks what it latched. With
+# --network every frame is instead sent over a loopback socket to a
+# second strip, once encoded and once raw.
+
+import gc
+import sys
+import json
+import time
+import argparse
+from timeit import default_timer as timer
+
+import PyLED
+from colors import *
+
+SIZES = [32, 100, 1000, 10000]
+
+# Every benchmark runs with wait = 0 so each tick renders a frame
+ANIMATIONS = [
+    ('pulse', lambda: PyLED.pulse(cycles = 1000, steps = 15)),
+    ('flash', lambda: PyLED.flash(cycles = 1000, wait = 0)),
+    ('sweep', lambda: PyLED.sweep([RED, GREEN, BLUE], wait = 0)),
+    ('centerSweep', lambda: PyLED.centerSweep([RED, GREEN, BLUE], wait = 0)),
+    ('shift', lambda: PyLED.shift(cycles = 100000)),
+    ('colorfade', lambda: PyLED.colorfade([RED, BLUE, GREEN, WHITE, BLACK])),
+    ('wave', lambda: PyLED.wave([RED, BLUE, GREEN], cycles = 100, wait = 0)),
+    ('burstSweep', lambda: PyLED.burstSweep([RED, BLUE], cycles = 100, wait = 0)),
+]
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round((len(values) - 1) * pct / 100.0))
+    return values[index]
+
+def bench(factory, size, frames, streams = 1, workers = 0):
+    # The gc generation 0 counter goes up for every container object
+    # (list, iterator, animation state; not bytearrays) created and down
+    # for every one freed, so with the collector off its growth over a
+    # frame is the objects the frame retained. Temporaries created and
+    # freed inside the frame cancel out; Python 2 has no way to count
+    # those. The strip is split into `streams`
+    # streams each running the animation, rendered by `workers` processes
+    # when that is not 0. Worker streams cannot take new animations, so
+    # then the run ends when the first animations do.
+    output = PyLED.NullOutput()
+    strip = PyLED.Strip(size, output)
+    parts = [strip.newstream(size / streams) for _ in xrange(streams)]
+    for stream in parts:
+        stream.fill(RAINBOW)
+        stream.animate(factory())
+    if workers:
+        strip.enableParallel(workers)
+
+    latencies = list()
+    retained = 0
+    frame = 0
+
+    gcold = gc.isenabled()
+    gc.disable()
+    try:
+        while output.frames < frames:
+            if not workers:
+                for stream in parts:
+                    if not stream.hasAnimation():
+                        stream.animate(factory())
+            nextframe = strip.nextFrame()
+            if nextframe is None:
+                break
+            frame = max(frame + 1, nextframe if nextframe is not None else 0)
+            before = output.frames
+            count = gc.get_count()[0]
+            start = timer()
+            strip.tick(frame)
+            elapsed = timer() - start
+            if output.frames > before:
+                latencies.append(elapsed)
+                retained += gc.get_count()[0] - count
+    finally:
+        if gcold:
+            gc.enable()
+        strip.stopParallel()
+
+    total = sum(latencies)
+    return {
+        'leds': size,
+        'frames': len(latencies),
+        'fps': len(latencies) / total if total else None,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'net_gc_objects_per_frame': float(retained) / len(latencies),
+    }
+
+def objectSize(obj):
+    # the object itself plus its attribute dict, if it has one
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def bench_objects(count, frames):
+    # Memory per object, and the scheduler's throughput with `count`
+    # one-LED streams (one per fixture), each running its own animation.
+    output = PyLED.NullOutput()
+    strip = PyLED.Strip(count, output)
+    streams = [strip.newstream(1) for _ in xrange(count)]
+    for stream in streams:
+        stream.fill(RED)
+        stream.animate(PyLED.flash(cycles = frames, wait = 0))
+
+    start = timer()
+    for frame in xrange(frames):
+        strip.tick(frame)
+    elapsed = timer() - start
+
+    return {
+        'streams': count,
+        'stream_bytes': objectSize(streams[0]),
+        'animation_bytes': {name: objectSize(factory()) for name, factory in ANIMATIONS},
+        'fps': frames / elapsed,
+        'stream_ticks_per_sec': count * frames / elapsed,
+    }
+
+def bench_network(factory, size, frames, encode = True):
+    # Frames from a strip with a FrameSender output, over loopback, into a
+    # FrameReceiver feeding a second strip. Time runs until the receiver
+    # has decoded the last frame.
+    rstrip = PyLED.Strip(size, PyLED.NullOutput())
+    receiver = rstrip.listen(0, '127.0.0.1')
+    sender = PyLED.FrameSender('127.0.0.1', receiver.port, encode = encode)
+    strip = PyLED.Strip(size, sender)
+    stream = strip.newstream(size)
+    stream.fill(RAINBOW)
+
+    frame = 0
+    start = timer()
+    try:
+        while sender.frames < frames:
+            if not stream.hasAnimation():
+                stream.animate(factory())
+            nextframe = strip.nextFrame()
+            frame = max(frame + 1, nextframe if nextframe is not None else 0)
+            strip.tick(frame)
+        while receiver.frames < sender.frames and timer() - start < 60:
+            time.sleep(0.0005)
+        elapsed = timer() - start
+    finally:
+        sender.close()
+        receiver.stop()
+        receiver.join()
+
+    return {
+        'leds': size,
+        'encode': encode,
+        'frames': receiver.frames,
+        'fps': receiver.frames / elapsed,
+        'bytes_per_frame': float(sender.bytes) / sender.frames,
+        'raw_bytes_per_frame': float(size * 3),
+        'match': rstrip[0].data.tobytes() == bytes(sender.prev),
+    }
+
+def bench_spi(factory, size, frames, bufsiz = 4096, speed = 2000000):
+    # Frames through SpiOutput into a FakeSpiDevice, checking that what
+    # the chips would latch is exactly what the strip showed
+    device = PyLED.FakeSpiDevice(bufsiz)
+    output = PyLED.SpiOutput(speed = speed, bufsiz = bufsiz, device = device)
+    strip = PyLED.Strip(size, output)
+    stream = strip.newstream(size)
+    stream.fill(RAINBOW)
+
+    shown = list()
+    frame = 0
+    start = timer()
+    while len(shown) < frames:
+        if not stream.hasAnimation():
+            stream.animate(factory())
+        nextframe = strip.nextFrame()
+        frame = max(frame + 1, nextframe if nextframe is not None else 0)
+        before = device.messages
+        strip.tick(frame)
+        if device.messages > before:
+            shown.append(strip.getFrame().tobytes())
+    elapsed = timer() - start
+
+    return {
+        'leds': size,
+        'frames': len(shown),
+        'fps': len(shown) / elapsed,
+        'ioctls_per_frame': float(device.messages) / len(shown),
+        'wire_ms': device.wireTime() * 1000 / len(shown),
+        'match': device.frames() == shown,
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark PyLED animations')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES)
+    parser.add_argument('--frames', type = int, default = 200)
+    parser.add_argument('--only', nargs = '+', help = 'animation names to run')
+    parser.add_argument('--json', action = 'store_true', help = 'write results as JSON')
+    parser.add_argument('--objects', type = int, metavar = 'STREAMS',
+                        help = 'measure object sizes and scheduling of this many one-LED streams instead')
+    parser.add_argument('--streams', type = int, default = 1, help = 'streams to split each strip into')
+    parser.add_argument('--workers', type = int, default = 0,
+                        help = 'render the streams in this many processes')
+    parser.add_argument('--spi', type = int, metavar = 'BUFSIZ',
+                        help = 'write through SpiOutput to a fake spidev with this bufsiz')
+    parser.add_argument('--network', action = 'store_true',
+                        help = 'send frames over a loopback socket, encoded and raw')
+    args = parser.parse_args(argv)
+
+    if args.objects:
+        result = bench_objects(args.objects, args.frames)
+        if args.json:
+            json.dump(result, sys.stdout, indent = 2, sort_keys = True)
+            sys.stdout.write('\n')
+        else:
+            print('%d streams: %.1f fps, %.0f stream ticks/sec, %d bytes per stream' % (
+                result['streams'], result['fps'], result['stream_ticks_per_sec'], result['stream_bytes']))
+            for name, size in sorted(result['animation_bytes'].items()):
+                print('%-12s %5d bytes' % (name, size))
+        return
+
+    results = list()
+    for name, factory in ANIMATIONS:
+        if args.only and name not in args.only:
+            continue
+        for size in args.sizes:
+            for encode in ((True, False) if args.network else (None,)):
+                result = {'animation': name}
+                try:
+                    if args.spi:
+                        result.update(bench_spi(factory, size, args.frames, args.spi))
+                    elif args.network:
+                        result.update(bench_network(factory, size, args.frames, encode))
+                    else:
+                        result.update(bench(factory, size, args.frames, args.streams, args.workers))
+                except Exception as e:
+                    result['error'] = '%s: %s' % (e.__class__.__name__, e)
+                results.append(result)
+                if args.json:
+                    continue
+                if 'error' in result:
+                    print('%-12s %6d  %s' % (name, size, result['error']))
+                elif args.spi:
+                    print('%-12s %6d  %9.1f fps  %4.1f ioctls/frame  %7.3f ms on the wire%s' % (
+                        name, size, result['fps'], result['ioctls_per_frame'], result['wire_ms'],
+                        '' if result['match'] else '  MISMATCH'))
+                elif args.network:
+                    print('%-12s %6d  %-3s %9.1f fps  %9.1f bytes/frame (raw %d)%s' % (
+                        name, size, 'enc' if encode else 'raw', result['fps'],
+                        result['bytes_per_frame'], result['raw_bytes_per_frame'],
+                        '' if result['match'] else '  MISMATCH'))
+                else:
+                    print('%-12s %6d  %9.1f fps  p50 %7.3f  p99 %7.3f ms  %5.1f net gc objects/frame' % (
+                        name, size, result['fps'], result['p50_ms'], result['p99_ms'],
+                        result['net_gc_objects_per_frame']))
+
+    if args.json:
+        json.dump({'python': sys.version.split()[0],
+                   'numpy': PyLED.numpy is not None,
+                   'results': results}, sys.stdout, indent = 2, sort_keys = True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
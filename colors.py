@@ -1,142 +1,241 @@
-BLACK                   = bytearray(b'\x00\x00\x00')#, 'Black']
-AQUA                    = bytearray(b'\x00\xff\xff')#, 'Aqua']
-AQUAMARINE              = bytearray(b'\x7f\xff\xd4')#, 'Aquamarine']
-AZURE                   = bytearray(b'\xf0\xff\xff')#, 'Azure']
-BEIGE                   = bytearray(b'\xf5\xf5\xdc')#, 'Beige']
-BISQUE                  = bytearray(b'\xff\xe4\xc4')#, 'Bisque']
-BLANCHEDALMOND          = bytearray(b'\xff\xeb\xcd')#, 'Blanchedalmond']
-BLUE                    = bytearray(b'\x00\x00\xff')#, 'Blue']
-BLUEVIOLET              = bytearray(b'\x8a\x2b\xe2')#, 'Blueviolet']
-BROWN                   = bytearray(b'\xa5\x2a\x2a')#, 'Brown']
-BURLYWOOD               = bytearray(b'\xde\xb8\x87')#, 'Burlywood']
-CADETBLUE               = bytearray(b'\x5f\x9e\xa0')#, 'Cadetblue']
-CHARTREUSE              = bytearray(b'\x7f\xff\x00')#, 'Chartreuse']
-CHOCOLATE               = bytearray(b'\xd2\x69\x1e')#, 'Chocolate']
-CORAL                   = bytearray(b'\xff\x7f\x50')#, 'Coral']
-CORNFLOWERBLUE          = bytearray(b'\x64\x95\xed')#, 'Cornflowerblue']
-CORNSILK                = bytearray(b'\xff\xf8\xdc')#, 'Cornsilk']
-CRIMSON                 = bytearray(b'\xdc\x14\x3c')#, 'Crimson']
-CYAN                    = bytearray(b'\x00\xff\xff')#, 'Cyan']
-DARKBLUE                = bytearray(b'\x00\x00\x8b')#, 'Darkblue']
-DARKCYAN                = bytearray(b'\x00\x8b\x8b')#, 'Darkcyan']
-DARKGOLDENROD           = bytearray(b'\xb8\x86\x0b')#, 'Darkgoldenrod']
-DARKGRAY                = bytearray(b'\xa9\xa9\xa9')#, 'Darkgray']
-DARKGREEN               = bytearray(b'\x00\x64\x00')#, 'Darkgreen']
-DARKKHAKI               = bytearray(b'\xbd\xb7\x6b')#, 'Darkkhaki']
-DARKMAGENTA             = bytearray(b'\x8b\x00\x8b')#, 'Darkmagenta']
-DARKOLIVEGREEN          = bytearray(b'\x55\x6b\x2f')#, 'Darkolivegreen']
-DARKORANGE              = bytearray(b'\xff\x8c\x00')#, 'Darkorange']
-DARKORCHID              = bytearray(b'\x99\x32\xcc')#, 'Darkorchid']
-DARKRED                 = bytearray(b'\x8b\x00\x00')#, 'Darkred']
-DARKSALMON              = bytearray(b'\xe9\x96\x7a')#, 'Darksalmon']
-DARKSEAGREEN            = bytearray(b'\x8f\xbc\x8f')#, 'Darkseagreen']
-DARKSLATEBLUE           = bytearray(b'\x48\x3d\x8b')#, 'Darkslateblue']
-DARKSLATEGRAY           = bytearray(b'\x2f\x4f\x4f')#, 'Darkslategray']
-DARKTURQUOISE           = bytearray(b'\x00\xce\xd1')#, 'Darkturquoise']
-DARKVIOLET              = bytearray(b'\x94\x00\xd3')#, 'Darkvoilet']
-DEEPPINK                = bytearray(b'\xff\x14\x93')#, 'Deeppink']
-DEEPSKYBLUE             = bytearray(b'\x00\xbf\xff')#, 'Deepskyblue']
-DIMGRAY                 = bytearray(b'\x69\x69\x69')#, 'Dimgray']
-DODGERBLUE              = bytearray(b'\x1e\x90\xff')#, 'Dodgerblue']
-FIREBRICK               = bytearray(b'\xb2\x22\x22')#, 'Firebrick']
-FLORALWHITE             = bytearray(b'\xff\xfa\xf0')#, 'Floralwhite']
-FORESTGREEN             = bytearray(b'\x22\x8b\x22')#, 'Forestgreen']
-FUCHSIA                 = bytearray(b'\xff\x00\xff')#, 'Fuchsia']
-GAINSBORO               = bytearray(b'\xdc\xdc\xdc')#, 'Gainsboro']
-GHOSTWHITE              = bytearray(b'\xf8\xf8\xff')#, 'Ghostwhite']
-GOLD                    = bytearray(b'\xff\xd7\x00')#, 'Gold']
-GOLDENROD               = bytearray(b'\xda\xa5\x20')#, 'Goldenrod']
-GRAY                    = bytearray(b'\x80\x80\x80')#, 'Gray']
-GREEN                   = bytearray(b'\x00\xff\x00')#, 'Green']
-GREENYELLOW             = bytearray(b'\xad\xff\x2f')#, 'Greenyellow']
-HONEYDEW                = bytearray(b'\xf0\xff\xf0')#, 'Honeydew']
-HOTPINK                 = bytearray(b'\xff\x69\xb4')#, 'Hotpink']
-INDIANRED               = bytearray(b'\xcd\x5c\x5c')#, 'Indianred']
-INDIGO                  = bytearray(b'\x4b\x00\x82')#, 'Indigo']
-IVORY                   = bytearray(b'\xff\xff\xf0')#, 'Ivory']
-KHAKI                   = bytearray(b'\xf0\xe6\x8c')#, 'Khaki']
-LAVENDER                = bytearray(b'\xe6\xe6\xfa')#, 'Lavender']
-LAVENDERBLUSH           = bytearray(b'\xff\xf0\xf5')#, 'Lavenderblush']
-LAWNGREEN               = bytearray(b'\x7c\xfc\x00')#, 'Lawngreen']
-LEMONCHIFFON            = bytearray(b'\xff\xfa\xcd')#, 'Lemonchiffon']
-LIGHTBLUE               = bytearray(b'\xad\xd8\xe6')#, 'Lightblue']
-LIGHTCORAL              = bytearray(b'\xf0\x80\x80')#, 'Lightcoral']
-LIGHTCYAN               = bytearray(b'\xe0\xff\xff')#, 'Lightcyan']
-LIGHTGOLDENRODYELLOW    = bytearray(b'\xfa\xfa\xd2')#, 'Lightgoldenrodyellow']
-LIGHTGRAY               = bytearray(b'\xd3\xd3\xd3')#, 'Lightgray']
-LIGHTGREEN              = bytearray(b'\x90\xee\x90')#, 'Lightgreen']
-LIGHTPINK               = bytearray(b'\xff\xb6\xc1')#, 'Lightpink']
-LIGHTRED                = bytearray(b'\xff\x29\x29')#, 'Lightred']
-LIGHTSALMON             = bytearray(b'\xff\xa0\x7a')#, 'Lightsalmon']
-LIGHTSEAGREEN           = bytearray(b'\x20\xb2\xaa')#, 'Lightseagreen']
-LIGHTSKYBLUE            = bytearray(b'\x87\xce\xfa')#, 'Lightskyblue']
-LIGHTSLATEGRAY          = bytearray(b'\x77\x88\x99')#, 'Lightslategray']
-LIGHTSTEELBLUE          = bytearray(b'\xb0\xc4\xde')#, 'Lightsteelblue']
-LIGHTYELLOW             = bytearray(b'\xff\xff\xe0')#, 'Lightyellow']
-LIME                    = bytearray(b'\x00\xff\x00')#, 'Lime']
-LIMEGREEN               = bytearray(b'\x32\xcd\x32')#, 'Limegreen']
-LINEN                   = bytearray(b'\xfa\xf0\xe6')#, 'Linen']
-MAGENTA                 = bytearray(b'\xff\x00\xff')#, 'Magenta']
-MAROON                  = bytearray(b'\x80\x00\x00')#, 'Maroon']
-MEDIUMAQUAMARINE        = bytearray(b'\x66\xcd\xaa')#, 'Mediumaquamarine']
-MEDIUMBLUE              = bytearray(b'\x00\x00\xcd')#, 'Mediumblue']
-MEDIUMORCHID            = bytearray(b'\xba\x55\xd3')#, 'Mediumorchid']
-MEDIUMPURPLE            = bytearray(b'\x93\x70\xd8')#, 'Mediumpurple']
-MEDIUMSEAGREEN          = bytearray(b'\x3c\xb3\x71')#, 'Mediumseagreen']
-MEDIUMSLATEBLUE         = bytearray(b'\x7b\x68\xee')#, 'Mediumslateblue']
-MEDIUMSPRINGGREEN       = bytearray(b'\x00\xfa\x9a')#, 'Mediumspringgreen']
-MEDIUMTURQUOISE         = bytearray(b'\x48\xd1\xcc')#, 'Mediumturquoise']
-MEDIUMVIOLETRED         = bytearray(b'\xc7\x15\x85')#, 'Mediumvioletred']
-MIDNIGHTBLUE            = bytearray(b'\x19\x19\x70')#, 'Midnightblue']
-MINTCREAM               = bytearray(b'\xf5\xff\xfa')#, 'Mintcream']
-MISTYROSE               = bytearray(b'\xff\xe4\xe1')#, 'Mistyrose']
-MOCCASIN                = bytearray(b'\xff\xe4\xb5')#, 'Moccasin']
-NAVAJOWHITE             = bytearray(b'\xff\xde\xad')#, 'Navajowhite']
-NAVY                    = bytearray(b'\x00\x00\x80')#, 'Navy']
-OLDLACE                 = bytearray(b'\xfd\xf5\xe6')#, 'Oldlace']
-OLIVE                   = bytearray(b'\x80\x80\x00')#, 'Olive']
-OLIVEDRAB               = bytearray(b'\x6b\x8e\x23')#, 'Olivedrab']
-ORANGE                  = bytearray(b'\xff\x65\x00')#, 'Orange']
-ORANGERED               = bytearray(b'\xff\x45\x00')#, 'Ornagered']
-ORCHID                  = bytearray(b'\xda\x70\xd6')#, 'Orchid']
-PALEGOLDENROD           = bytearray(b'\xee\xe8\xaa')#, 'Palegoldenrod']
-PALEGREEN               = bytearray(b'\x98\xfb\x98')#, 'Palegreen']
-PALETURQUOISE           = bytearray(b'\xaf\xee\xee')#, 'Paleturquoise']
-PALEVIOLETRED           = bytearray(b'\xd8\x70\x93')#, 'Palevioletred']
-PAPAYAWHIP              = bytearray(b'\xff\xef\xd5')#, 'Papayawhip']
-PEACHPUFF               = bytearray(b'\xff\xda\xb9')#, 'Peachpuff']
-PERU                    = bytearray(b'\xcd\x85\x3f')#, 'Peru']
-PINK                    = bytearray(b'\xff\x4a\x6a')#, 'Pink']
-PLUM                    = bytearray(b'\xdd\xa0\xdd')#, 'Plum']
-POWDERBLUE              = bytearray(b'\xb0\xe0\xe6')#, 'Powderblue']
-PURPLE                  = bytearray(b'\x80\x00\x80')#, 'Purple']
-RED                     = bytearray(b'\xff\x00\x00')#, 'Red']
-ROSYBROWN               = bytearray(b'\xbc\x8f\x8f')#, 'Rosybrown']
-ROYALBLUE               = bytearray(b'\x41\x69\xe1')#, 'Royalblue']
-SADDLEBROWN             = bytearray(b'\x8b\x45\x13')#, 'Saddlebrown']
-SALMON                  = bytearray(b'\xfa\x80\x72')#, 'Salmon']
-SANDYBROWN              = bytearray(b'\xf4\xa4\x60')#, 'Sandybrown']
-SEAGREEN                = bytearray(b'\x2e\x8b\x57')#, 'Seagreen']
-SEASHELL                = bytearray(b'\xff\xf5\xee')#, 'Seashell']
-SIENNA                  = bytearray(b'\xa0\x52\x2d')#, 'Sienna']
-SILVER                  = bytearray(b'\xc0\xc0\xc0')#, 'Silver']
-SKYBLUE                 = bytearray(b'\x87\xce\xeb')#, 'Skyblue']
-SLATEBLUE               = bytearray(b'\x6a\x5a\xcd')#, 'Slateblue']
-SLATEGRAY               = bytearray(b'\x70\x80\x90')#, 'Slategray']
-SNOW                    = bytearray(b'\xff\xfa\xfa')#, 'Snow']
-SPRINGGREEN             = bytearray(b'\x00\xff\x7f')#, 'Springgreen']
-STEELBLUE               = bytearray(b'\x46\x82\xb4')#, 'Steelblue']
-TAN                     = bytearray(b'\xd2\xb4\x8c')#, 'Tan']
-TEAL                    = bytearray(b'\x00\x80\x80')#, 'Teal']
-THISTLE                 = bytearray(b'\xd8\xbf\xd8')#, 'Thistle']
-TOMATO                  = bytearray(b'\xff\x63\x47')#, 'Tomato']
-TURQUOISE               = bytearray(b'\x40\xe0\xd0')#, 'Turquoise']
-VIOLET                  = bytearray(b'\xee\x82\xee')#, 'Violet']
-WHEAT                   = bytearray(b'\xf5\xde\xb3')#, 'Wheat']
-WHITE                   = bytearray(b'\xff\xff\xff')#, 'White']
-WHITESMOKE              = bytearray(b'\xf5\xf5\xf5')#, 'Whitesmoke']
-YELLOW                  = bytearray(b'\xff\xff\x00')#, 'Yellow']
-YELLOWGREEN             = bytearray(b'\x9a\xcd\x32')#, 'Yellowgreen']
+from collections import OrderedDict
+
+# Colours are immutable byte strings, so they can be shared freely; copy
+# one into a bytearray to change it.
+
+BLACK                   = b'\x00\x00\x00'#, 'Black']
+AQUA                    = b'\x00\xff\xff'#, 'Aqua']
+AQUAMARINE              = b'\x7f\xff\xd4'#, 'Aquamarine']
+AZURE                   = b'\xf0\xff\xff'#, 'Azure']
+BEIGE                   = b'\xf5\xf5\xdc'#, 'Beige']
+BISQUE                  = b'\xff\xe4\xc4'#, 'Bisque']
+BLANCHEDALMOND          = b'\xff\xeb\xcd'#, 'Blanchedalmond']
+BLUE                    = b'\x00\x00\xff'#, 'Blue']
+BLUEVIOLET              = b'\x8a\x2b\xe2'#, 'Blueviolet']
+BROWN                   = b'\xa5\x2a\x2a'#, 'Brown']
+BURLYWOOD               = b'\xde\xb8\x87'#, 'Burlywood']
+CADETBLUE               = b'\x5f\x9e\xa0'#, 'Cadetblue']
+CHARTREUSE              = b'\x7f\xff\x00'#, 'Chartreuse']
+CHOCOLATE               = b'\xd2\x69\x1e'#, 'Chocolate']
+CORAL                   = b'\xff\x7f\x50'#, 'Coral']
+CORNFLOWERBLUE          = b'\x64\x95\xed'#, 'Cornflowerblue']
+CORNSILK                = b'\xff\xf8\xdc'#, 'Cornsilk']
+CRIMSON                 = b'\xdc\x14\x3c'#, 'Crimson']
+CYAN                    = b'\x00\xff\xff'#, 'Cyan']
+DARKBLUE                = b'\x00\x00\x8b'#, 'Darkblue']
+DARKCYAN                = b'\x00\x8b\x8b'#, 'Darkcyan']
+DARKGOLDENROD           = b'\xb8\x86\x0b'#, 'Darkgoldenrod']
+DARKGRAY                = b'\xa9\xa9\xa9'#, 'Darkgray']
+DARKGREEN               = b'\x00\x64\x00'#, 'Darkgreen']
+DARKKHAKI               = b'\xbd\xb7\x6b'#, 'Darkkhaki']
+DARKMAGENTA             = b'\x8b\x00\x8b'#, 'Darkmagenta']
+DARKOLIVEGREEN          = b'\x55\x6b\x2f'#, 'Darkolivegreen']
+DARKORANGE              = b'\xff\x8c\x00'#, 'Darkorange']
+DARKORCHID              = b'\x99\x32\xcc'#, 'Darkorchid']
+DARKRED                 = b'\x8b\x00\x00'#, 'Darkred']
+DARKSALMON              = b'\xe9\x96\x7a'#, 'Darksalmon']
+DARKSEAGREEN            = b'\x8f\xbc\x8f'#, 'Darkseagreen']
+DARKSLATEBLUE           = b'\x48\x3d\x8b'#, 'Darkslateblue']
+DARKSLATEGRAY           = b'\x2f\x4f\x4f'#, 'Darkslategray']
+DARKTURQUOISE           = b'\x00\xce\xd1'#, 'Darkturquoise']
+DARKVIOLET              = b'\x94\x00\xd3'#, 'Darkvoilet']
+DEEPPINK                = b'\xff\x14\x93'#, 'Deeppink']
+DEEPSKYBLUE             = b'\x00\xbf\xff'#, 'Deepskyblue']
+DIMGRAY                 = b'\x69\x69\x69'#, 'Dimgray']
+DODGERBLUE              = b'\x1e\x90\xff'#, 'Dodgerblue']
+FIREBRICK               = b'\xb2\x22\x22'#, 'Firebrick']
+FLORALWHITE             = b'\xff\xfa\xf0'#, 'Floralwhite']
+FORESTGREEN             = b'\x22\x8b\x22'#, 'Forestgreen']
+FUCHSIA                 = b'\xff\x00\xff'#, 'Fuchsia']
+GAINSBORO               = b'\xdc\xdc\xdc'#, 'Gainsboro']
+GHOSTWHITE              = b'\xf8\xf8\xff'#, 'Ghostwhite']
+GOLD                    = b'\xff\xd7\x00'#, 'Gold']
+GOLDENROD               = b'\xda\xa5\x20'#, 'Goldenrod']
+GRAY                    = b'\x80\x80\x80'#, 'Gray']
+GREEN                   = b'\x00\xff\x00'#, 'Green']
+GREENYELLOW             = b'\xad\xff\x2f'#, 'Greenyellow']
+HONEYDEW                = b'\xf0\xff\xf0'#, 'Honeydew']
+HOTPINK                 = b'\xff\x69\xb4'#, 'Hotpink']
+INDIANRED               = b'\xcd\x5c\x5c'#, 'Indianred']
+INDIGO                  = b'\x4b\x00\x82'#, 'Indigo']
+IVORY                   = b'\xff\xff\xf0'#, 'Ivory']
+KHAKI                   = b'\xf0\xe6\x8c'#, 'Khaki']
+LAVENDER                = b'\xe6\xe6\xfa'#, 'Lavender']
+LAVENDERBLUSH           = b'\xff\xf0\xf5'#, 'Lavenderblush']
+LAWNGREEN               = b'\x7c\xfc\x00'#, 'Lawngreen']
+LEMONCHIFFON            = b'\xff\xfa\xcd'#, 'Lemonchiffon']
+LIGHTBLUE               = b'\xad\xd8\xe6'#, 'Lightblue']
+LIGHTCORAL              = b'\xf0\x80\x80'#, 'Lightcoral']
+LIGHTCYAN               = b'\xe0\xff\xff'#, 'Lightcyan']
+LIGHTGOLDENRODYELLOW    = b'\xfa\xfa\xd2'#, 'Lightgoldenrodyellow']
+LIGHTGRAY               = b'\xd3\xd3\xd3'#, 'Lightgray']
+LIGHTGREEN              = b'\x90\xee\x90'#, 'Lightgreen']
+LIGHTPINK               = b'\xff\xb6\xc1'#, 'Lightpink']
+LIGHTRED                = b'\xff\x29\x29'#, 'Lightred']
+LIGHTSALMON             = b'\xff\xa0\x7a'#, 'Lightsalmon']
+LIGHTSEAGREEN           = b'\x20\xb2\xaa'#, 'Lightseagreen']
+LIGHTSKYBLUE            = b'\x87\xce\xfa'#, 'Lightskyblue']
+LIGHTSLATEGRAY          = b'\x77\x88\x99'#, 'Lightslategray']
+LIGHTSTEELBLUE          = b'\xb0\xc4\xde'#, 'Lightsteelblue']
+LIGHTYELLOW             = b'\xff\xff\xe0'#, 'Lightyellow']
+LIME                    = b'\x00\xff\x00'#, 'Lime']
+LIMEGREEN               = b'\x32\xcd\x32'#, 'Limegreen']
+LINEN                   = b'\xfa\xf0\xe6'#, 'Linen']
+MAGENTA                 = b'\xff\x00\xff'#, 'Magenta']
+MAROON                  = b'\x80\x00\x00'#, 'Maroon']
+MEDIUMAQUAMARINE        = b'\x66\xcd\xaa'#, 'Mediumaquamarine']
+MEDIUMBLUE              = b'\x00\x00\xcd'#, 'Mediumblue']
+MEDIUMORCHID            = b'\xba\x55\xd3'#, 'Mediumorchid']
+MEDIUMPURPLE            = b'\x93\x70\xd8'#, 'Mediumpurple']
+MEDIUMSEAGREEN          = b'\x3c\xb3\x71'#, 'Mediumseagreen']
+MEDIUMSLATEBLUE         = b'\x7b\x68\xee'#, 'Mediumslateblue']
+MEDIUMSPRINGGREEN       = b'\x00\xfa\x9a'#, 'Mediumspringgreen']
+MEDIUMTURQUOISE         = b'\x48\xd1\xcc'#, 'Mediumturquoise']
+MEDIUMVIOLETRED         = b'\xc7\x15\x85'#, 'Mediumvioletred']
+MIDNIGHTBLUE            = b'\x19\x19\x70'#, 'Midnightblue']
+MINTCREAM               = b'\xf5\xff\xfa'#, 'Mintcream']
+MISTYROSE               = b'\xff\xe4\xe1'#, 'Mistyrose']
+MOCCASIN                = b'\xff\xe4\xb5'#, 'Moccasin']
+NAVAJOWHITE             = b'\xff\xde\xad'#, 'Navajowhite']
+NAVY                    = b'\x00\x00\x80'#, 'Navy']
+OLDLACE                 = b'\xfd\xf5\xe6'#, 'Oldlace']
+OLIVE                   = b'\x80\x80\x00'#, 'Olive']
+OLIVEDRAB               = b'\x6b\x8e\x23'#, 'Olivedrab']
+ORANGE                  = b'\xff\x65\x00'#, 'Orange']
+ORANGERED               = b'\xff\x45\x00'#, 'Ornagered']
+ORCHID                  = b'\xda\x70\xd6'#, 'Orchid']
+PALEGOLDENROD           = b'\xee\xe8\xaa'#, 'Palegoldenrod']
+PALEGREEN               = b'\x98\xfb\x98'#, 'Palegreen']
+PALETURQUOISE           = b'\xaf\xee\xee'#, 'Paleturquoise']
+PALEVIOLETRED           = b'\xd8\x70\x93'#, 'Palevioletred']
+PAPAYAWHIP              = b'\xff\xef\xd5'#, 'Papayawhip']
+PEACHPUFF               = b'\xff\xda\xb9'#, 'Peachpuff']
+PERU                    = b'\xcd\x85\x3f'#, 'Peru']
+PINK                    = b'\xff\x4a\x6a'#, 'Pink']
+PLUM                    = b'\xdd\xa0\xdd'#, 'Plum']
+POWDERBLUE              = b'\xb0\xe0\xe6'#, 'Powderblue']
+PURPLE                  = b'\x80\x00\x80'#, 'Purple']
+RED                     = b'\xff\x00\x00'#, 'Red']
+ROSYBROWN               = b'\xbc\x8f\x8f'#, 'Rosybrown']
+ROYALBLUE               = b'\x41\x69\xe1'#, 'Royalblue']
+SADDLEBROWN             = b'\x8b\x45\x13'#, 'Saddlebrown']
+SALMON                  = b'\xfa\x80\x72'#, 'Salmon']
+SANDYBROWN              = b'\xf4\xa4\x60'#, 'Sandybrown']
+SEAGREEN                = b'\x2e\x8b\x57'#, 'Seagreen']
+SEASHELL                = b'\xff\xf5\xee'#, 'Seashell']
+SIENNA                  = b'\xa0\x52\x2d'#, 'Sienna']
+SILVER                  = b'\xc0\xc0\xc0'#, 'Silver']
+SKYBLUE                 = b'\x87\xce\xeb'#, 'Skyblue']
+SLATEBLUE               = b'\x6a\x5a\xcd'#, 'Slateblue']
+SLATEGRAY               = b'\x70\x80\x90'#, 'Slategray']
+SNOW                    = b'\xff\xfa\xfa'#, 'Snow']
+SPRINGGREEN             = b'\x00\xff\x7f'#, 'Springgreen']
+STEELBLUE               = b'\x46\x82\xb4'#, 'Steelblue']
+TAN                     = b'\xd2\xb4\x8c'#, 'Tan']
+TEAL                    = b'\x00\x80\x80'#, 'Teal']
+THISTLE                 = b'\xd8\xbf\xd8'#, 'Thistle']
+TOMATO                  = b'\xff\x63\x47'#, 'Tomato']
+TURQUOISE               = b'\x40\xe0\xd0'#, 'Turquoise']
+VIOLET                  = b'\xee\x82\xee'#, 'Violet']
+WHEAT                   = b'\xf5\xde\xb3'#, 'Wheat']
+WHITE                   = b'\xff\xff\xff'#, 'White']
+WHITESMOKE              = b'\xf5\xf5\xf5'#, 'Whitesmoke']
+YELLOW                  = b'\xff\xff\x00'#, 'Yellow']
+YELLOWGREEN             = b'\x9a\xcd\x32'#, 'Yellowgreen']
 RAINBOW = [AQUA, AZURE, BEIGE, BISQUE, BLUE, BROWN, BURLYWOOD, CADETBLUE, CHARTREUSE, CHOCOLATE, CORAL, CORNFLOWERBLUE, CORNSILK, CRIMSON, CYAN, DARKBLUE, DARKCYAN, DARKGOLDENROD, DARKGRAY, DARKGREEN, DARKKHAKI, DARKMAGENTA, DARKOLIVEGREEN, DARKORANGE, DARKORCHID, DARKRED, DARKSALMON, DARKSEAGREEN, DARKSLATEBLUE, DARKSLATEGRAY, DARKTURQUOISE, DARKVIOLET, DEEPPINK, DEEPSKYBLUE, DIMGRAY, DODGERBLUE, FIREBRICK, FLORALWHITE, FORESTGREEN, FUCHSIA, GAINSBORO, GHOSTWHITE, GOLD, GOLDENROD, GRAY, GREEN, GREENYELLOW, HONEYDEW, HOTPINK, INDIANRED, INDIGO, IVORY, KHAKI, LAVENDER, LAVENDERBLUSH, LAWNGREEN, LEMONCHIFFON, LIGHTBLUE, LIGHTCORAL, LIGHTCYAN, LIGHTGOLDENRODYELLOW, LIGHTGRAY, LIGHTGREEN, LIGHTPINK, LIGHTSALMON, LIGHTSEAGREEN, LIGHTSKYBLUE, LIGHTSLATEGRAY, LIGHTSTEELBLUE, LIGHTYELLOW, LIME, LIMEGREEN, LINEN, MAGENTA, MAROON, MEDIUMAQUAMARINE, MEDIUMBLUE, MEDIUMORCHID, MEDIUMPURPLE, MEDIUMSEAGREEN, MEDIUMSLATEBLUE, MEDIUMSPRINGGREEN, MEDIUMTURQUOISE, MEDIUMVIOLETRED, MIDNIGHTBLUE, MINTCREAM, MISTYROSE, MOCCASIN, NAVAJOWHITE, NAVY, OLDLACE, OLIVE, OLIVEDRAB, ORANGE, ORANGERED, ORCHID, PALEGOLDENROD, PALEGREEN, PALETURQUOISE, PALEVIOLETRED, PAPAYAWHIP, PEACHPUFF, PERU, PINK, PLUM, POWDERBLUE, PURPLE, RED, ROSYBROWN, ROYALBLUE, SADDLEBROWN, SALMON, SANDYBROWN, SEAGREEN, SEASHELL, SIENNA, SILVER, SKYBLUE, SLATEBLUE, SLATEGRAY, SNOW, SPRINGGREEN, STEELBLUE, TAN, TEAL, THISTLE, TOMATO, TURQUOISE, VIOLET, WHEAT, WHITE, WHITESMOKE, YELLOW, YELLOWGREEN, YELLOWGREEN]
 #RAINBOW = [RED, GREEN, BLUE, YELLOW, VIOLET, ORANGE, GRAY, OLIVE, BROWN]
-NUM_COLORS = len(RAINBOW) - 1
\ No newline at end of file
+NUM_COLORS = len(RAINBOW) - 1
+
+# Name lookups, parsing and gradients. Nothing here is built until it is
+# first used, so importing the module stays cheap.
+
+color_names = None
+color_values = None
+
+parse_cache = OrderedDict()
+parse_cache_size = 256
+
+def normalizeName(name):
+    return name.upper().replace(' ', '').replace('_', '').replace('-', '')
+
+def colorNames():
+    # {'RED': b'\xff\x00\x00', ...} for every named colour above
+    global color_names, color_values
+    if color_names is None:
+        names = dict()
+        for key, value in globals().items():
+            if key.isupper() and isinstance(value, bytes) and len(value) == 3:
+                names[key] = value
+        color_names = names
+        color_values = frozenset(names.values())
+    return color_names
+
+def getColor(name, default = None):
+    # Named colour, ignoring case, spaces, dashes and underscores
+    return colorNames().get(normalizeName(name), default)
+
+def hexColor(text):
+    # '#ff8000', 'ff8000', '0xff8000' or the short '#f80'
+    text = text.strip().lower()
+    if text.startswith('#'):
+        text = text[1:]
+    elif text.startswith('0x'):
+        text = text[2:]
+    if len(text) == 3:
+        text = ''.join(c * 2 for c in text)
+    if len(text) != 6:
+        raise ValueError('Not a hex colour: %r' % (text,))
+    return bytes(bytearray([int(text[i:i + 2], 16) for i in (0, 2, 4)]))
+
+def hsvColor(hue, saturation = 1.0, value = 1.0):
+    # hue in degrees, saturation and value from 0 to 1
+    import colorsys
+    r, g, b = colorsys.hsv_to_rgb((hue % 360.0) / 360.0, saturation, value)
+    return bytes(bytearray([int(r * 255.0 + 0.5), int(g * 255.0 + 0.5), int(b * 255.0 + 0.5)]))
+
+def parseColor(value):
+    # A colour from a name, hex string ('#ff8000', '#f80', '0xff8000' or six
+    # bare digits), 'hsv(h, s, v)', an (r, g, b) sequence or a pixel
+    # buffer. A 3-byte string is one of the colours above as it is, a
+    # three letter name like 'red' if it is one, and otherwise a pixel.
+    # Parsed strings are cached.
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, (tuple, list)):
+        return bytes(bytearray(value))
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, bytes) and len(value) == 3:
+        colorNames()
+        if value in color_values:
+            return value
+        return getColor(value, value)
+    color = parse_cache.pop(value, None)
+    if color is None:
+        text = value.strip().lower()
+        if text.startswith('hsv(') and text.endswith(')'):
+            color = hsvColor(*[float(x) for x in text[4:-1].split(',')])
+        elif text.startswith('#') or text.startswith('0x'):
+            color = hexColor(text)
+        else:
+            color = getColor(text)
+            if color is None and len(text) == 6:
+                try:
+                    color = hexColor(text)
+                except ValueError:
+                    pass
+            if color is None:
+                raise ValueError('Unknown colour %r' % (value,))
+        while len(parse_cache) >= parse_cache_size:
+            parse_cache.popitem(last = False)
+    parse_cache[value] = color
+    return color
+
+def gradientTable(colors, steps = 256, curve = 'linear', space = 'rgb', cyclic = False):
+    # gradient.gradient() over colours given in any form parseColor()
+    # takes; tables are cached there
+    from gradient import gradient
+    return gradient([parseColor(c) for c in colors], steps, curve, space, cyclic)
+
+__all__ = [name for name in globals().keys() if name.isupper()] + [
+    'colorNames', 'getColor', 'hexColor', 'hsvColor', 'parseColor', 'gradientTable']
@@ -0,0 +1,159 @@
+#####################################
+# framecodec.py                     #
+# Author: noriah                    #
+# Compact encodings for LED frames  #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+# Three ways to store a frame:
+#
+#   RAW    the frame bytes as they are
+#   DELTA  only the blocks that changed since the previous frame, as
+#          records of <u32 start><u32 length><bytes>
+#   RLE    runs of identical pixels, as records of <u16 count><pixel>
+#
+# encodeFrame() picks whichever is smallest. DELTA frames can only be
+# decoded on top of the frame before them.
+
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RAW = 0
+DELTA = 1
+RLE = 2
+
+DELTA_RECORD = struct.Struct('<II')
+RLE_COUNT = struct.Struct('<H')
+RLE_MAX = 0xffff
+
+def asBytes(data):
+    # bytes() of a memoryview is its repr on python 2
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+def changedBlocks(prev, cur, block):
+    # one flag per block of `block` bytes: did it change?
+    if numpy is not None:
+        size = len(cur)
+        pad = -size % block
+        a = numpy.frombuffer(asBytes(prev), dtype = numpy.uint8)
+        b = numpy.frombuffer(asBytes(cur), dtype = numpy.uint8)
+        changed = a != b
+        if pad:
+            changed = numpy.concatenate((changed, numpy.zeros(pad, dtype = bool)))
+        return changed.reshape(-1, block).any(1).tolist()
+    p = memoryview(prev)
+    c = memoryview(cur)
+    return [p[i:i + block] != c[i:i + block] for i in xrange(0, len(cur), block)]
+
+def encodeDelta(prev, cur, block = 48):
+    # Changes are found a block at a time, so comparing is done on slices
+    # rather than byte by byte; neighbouring changed blocks share a record.
+    if len(prev) != len(cur):
+        raise ValueError('Frames differ in size')
+    size = len(cur)
+    out = bytearray()
+    start = None
+    flags = changedBlocks(prev, cur, block)
+    for n, changed in enumerate(flags + [False]):
+        if changed and start is None:
+            start = n * block
+        elif not changed and start is not None:
+            end = min(n * block, size)
+            out += DELTA_RECORD.pack(start, end - start)
+            out += cur[start:end]
+            start = None
+    return out
+
+def decodeDelta(payload, out):
+    # Patch out, which must hold the previous frame, in place. Returns the
+    # range of bytes that changed.
+    pos = 0
+    size = len(payload)
+    low = high = None
+    while pos < size:
+        start, length = DELTA_RECORD.unpack_from(payload, pos)
+        pos += DELTA_RECORD.size
+        out[start:start + length] = payload[pos:pos + length]
+        pos += length
+        if low is None:
+            low = start
+        high = start + length
+    if low is None:
+        return (0, 0)
+    return (low, high)
+
+def pixelRuns(frame, pixel_size):
+    # (start pixel, count) for each run of identical pixels
+    count = len(frame) / pixel_size
+    if count == 0:
+        return []
+    if numpy is not None:
+        pixels = numpy.frombuffer(asBytes(frame), dtype = numpy.uint8).reshape(count, pixel_size)
+        starts = numpy.flatnonzero((pixels[1:] != pixels[:-1]).any(1)) + 1
+        starts = [0] + starts.tolist()
+    else:
+        view = memoryview(frame)
+        starts = [0]
+        last = view[0:pixel_size]
+        for i in xrange(1, count):
+            pixel = view[i * pixel_size:(i + 1) * pixel_size]
+            if pixel != last:
+                starts.append(i)
+                last = pixel
+    ends = starts[1:] + [count]
+    return zip(starts, [e - s for s, e in zip(starts, ends)])
+
+def encodeRLE(frame, pixel_size):
+    out = bytearray()
+    for start, count in pixelRuns(frame, pixel_size):
+        pixel = frame[start * pixel_size:(start + 1) * pixel_size]
+        while count > 0:
+            n = min(count, RLE_MAX)
+            out += RLE_COUNT.pack(n)
+            out += pixel
+            count -= n
+    return out
+
+def decodeRLE(payload, out, pixel_size):
+    pos = 0
+    led = 0
+    size = len(payload)
+    while pos < size:
+        count, = RLE_COUNT.unpack_from(payload, pos)
+        pos += RLE_COUNT.size
+        pixel = asBytes(payload[pos:pos + pixel_size])
+        pos += pixel_size
+        out[led * pixel_size:(led + count) * pixel_size] = pixel * count
+        led += count
+    return (0, led * pixel_size)
+
+def encodeFrame(prev, cur, pixel_size, rle = True, block = 48):
+    # Returns (encoding, payload) with the smallest payload. Pass prev as
+    # None to get a frame that decodes on its own (a key frame).
+    best = (RAW, cur)
+    if prev is not None:
+        delta = encodeDelta(prev, cur, block)
+        if len(delta) < len(best[1]):
+            best = (DELTA, delta)
+    if rle:
+        runs = encodeRLE(cur, pixel_size)
+        if len(runs) < len(best[1]):
+            best = (RLE, runs)
+    return best
+
+def decodeFrame(encoding, payload, out, pixel_size):
+    # Decode into out in place, returning the range of bytes written
+    if encoding == RAW:
+        out[:] = payload
+        return (0, len(out))
+    elif encoding == DELTA:
+        return decodeDelta(payload, out)
+    elif encoding == RLE:
+        return decodeRLE(payload, out, pixel_size)
+    raise ValueError('Unknown frame encoding %r' % (encoding,))
@@ -0,0 +1,103 @@
+#####################################
+# gradient.py                       #
+# Author: noriah                    #
+# Colour gradients and easing       #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+# gradient() turns a list of colours into one buffer of pixels blending
+# from each colour to the next. Tables are built once per colour list and
+# kept, so animations only index into them:
+#
+#   table = gradient([RED, BLUE], 256, curve = 'cosine', space = 'hsv')
+#   pixel = table[i * 3:i * 3 + 3]
+
+import math
+import colorsys
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# t in [0, 1] to amount in [0, 1]
+EASINGS = {
+    'linear': lambda t: t,
+    'cosine': lambda t: (1.0 - math.cos(math.pi * t)) / 2.0,
+    'in': lambda t: t * t,
+    'out': lambda t: t * (2.0 - t),
+}
+
+SPACES = ('rgb', 'hsv')
+
+gradient_cache = OrderedDict()
+gradient_cache_size = 64
+
+def mixRGB(a, b, amounts):
+    # pixels from a to b for every amount, truncated like int()
+    size = len(a)
+    if numpy is not None:
+        a = numpy.array(bytearray(a), dtype = numpy.float64)
+        b = numpy.array(bytearray(b), dtype = numpy.float64)
+        t = numpy.array(amounts, dtype = numpy.float64).reshape(-1, 1)
+        return bytearray((a + (b - a) * t).astype(numpy.uint8).tostring())
+    out = bytearray()
+    for t in amounts:
+        out += bytearray([int(a[c] + (b[c] - a[c]) * t) for c in xrange(size)])
+    return out
+
+def mixHSV(a, b, amounts):
+    # Same, through HSV with the hue taking the short way round
+    ha, sa, va = colorsys.rgb_to_hsv(a[0] / 255.0, a[1] / 255.0, a[2] / 255.0)
+    hb, sb, vb = colorsys.rgb_to_hsv(b[0] / 255.0, b[1] / 255.0, b[2] / 255.0)
+    # a grey has no hue of its own, so take the other end's
+    if sa == 0:
+        ha = hb
+    if sb == 0:
+        hb = ha
+    dh = hb - ha
+    if dh > 0.5:
+        dh -= 1.0
+    elif dh < -0.5:
+        dh += 1.0
+    out = bytearray()
+    for t in amounts:
+        r, g, bl = colorsys.hsv_to_rgb((ha + dh * t) % 1.0, sa + (sb - sa) * t, va + (vb - va) * t)
+        out += bytearray([int(r * 255.0 + 0.5), int(g * 255.0 + 0.5), int(bl * 255.0 + 0.5)])
+    return out
+
+def gradient(colors, steps = 256, curve = 'linear', space = 'rgb', cyclic = False):
+    # Pixels blending through colors, steps of them from each colour up to
+    # (not including) the next; steps may be a list with one count per
+    # blend. A cyclic gradient blends the last colour back into the first,
+    # otherwise the last colour ends the table.
+    if curve not in EASINGS:
+        raise ValueError('Unknown easing curve %r' % (curve,))
+    if space not in SPACES:
+        raise ValueError('Unknown colour space %r' % (space,))
+    colors = [bytes(bytearray(c)) for c in colors]
+    blends = len(colors) if cyclic else len(colors) - 1
+    if isinstance(steps, (int, long)):
+        steps = [steps] * blends
+    steps = tuple(steps[:blends])
+
+    key = (tuple(colors), steps, curve, space, cyclic)
+    table = gradient_cache.pop(key, None)
+    if table is None:
+        ease = EASINGS[curve]
+        mix = mixHSV if space == 'hsv' else mixRGB
+        out = bytearray()
+        for i in xrange(blends):
+            n = steps[i]
+            if n <= 0:
+                continue
+            amounts = [ease(float(j) / n) for j in xrange(n)]
+            out += mix(bytearray(colors[i]), bytearray(colors[(i + 1) % len(colors)]), amounts)
+        if not cyclic:
+            out += colors[-1]
+        table = bytes(out)
+        while len(gradient_cache) >= gradient_cache_size:
+            gradient_cache.popitem(last = False)
+    gradient_cache[key] = table
+    return table
@@ -0,0 +1,371 @@
+#####################################
+# network.py                        #
+# Author: noriah                    #
+# Driving Strips over the network   #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+# Frames travel over TCP as messages of
+#
+#   <2s magic><u8 encoding><u32 frame><u32 payload size><payload>
+#
+# with the payload encoded by framecodec. DELTA messages only carry the
+# runs that changed since the message before, so every connection starts
+# with a frame that decodes on its own.
+#
+#   strip.listen(7777)                                  # on the Pi
+#   Strip(300, FrameSender('pi.local', 7777)).start()   # anywhere else
+
+import socket
+import struct
+import threading
+
+import framecodec
+from outputs import Output
+
+MAGIC = 'PL'
+PORT = 7777
+
+MESSAGE = struct.Struct('<2sBII')
+
+def frameLock(stream):
+    # The lock stream's strip takes frames under; receivers hold it while
+    # they write to the stream so no update is marked clean unshown
+    if stream.parent is not None:
+        return stream.parent.framelock
+    return threading.Lock()
+
+class FrameSender(Output):
+    # Output that sends every frame it is given to a FrameReceiver. With
+    # encode = False frames go out raw, which is what the encoding saves
+    # on. A lost connection is reopened on the next write.
+    def __init__(self, host, port = PORT, pixel_size = 3, encode = True, rle = True,
+                 keyframes = 300, block = 48):
+        self.host = host
+        self.port = port
+        self.pixel_size = pixel_size
+        self.encode = encode
+        self.rle = rle
+        self.keyframes = keyframes
+        self.block = block
+        self.sock = None
+        self.prev = None
+        self.frames = 0
+        self.bytes = 0
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.prev = None
+
+    def write(self, data):
+        if self.sock is None:
+            self.connect()
+        prev = self.prev
+        if self.keyframes and self.frames % self.keyframes == 0:
+            prev = None
+        if self.encode:
+            encoding, payload = framecodec.encodeFrame(prev, data, self.pixel_size, self.rle, self.block)
+        else:
+            encoding, payload = framecodec.RAW, data
+        try:
+            self.sock.sendall(MESSAGE.pack(MAGIC, encoding, self.frames, len(payload)))
+            self.sock.sendall(payload)
+        except socket.error:
+            self.close()
+            raise
+        if self.prev is None:
+            self.prev = bytearray(data)
+        else:
+            self.prev[:] = data
+        self.frames += 1
+        self.bytes += MESSAGE.size + len(payload)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class FrameReceiver(threading.Thread):
+    # Accepts one sender at a time and decodes its frames straight into
+    # stream, which the stream's strip then shows like any other change.
+    # Messages are read into one preallocated buffer.
+    def __init__(self, stream, port = PORT, host = ''):
+        threading.Thread.__init__(self)
+        self.stream = stream
+        self.header = bytearray(MESSAGE.size)
+        self.headerview = memoryview(self.header)
+        self.buffer = bytearray(stream.pixnum)
+        self.bufferview = memoryview(self.buffer)
+        self.frames = 0
+        self.bytes = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(1)
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        self.name = "Frame Receiver Thread"
+        self.daemon = True
+        self.dorun = True
+
+    def recvInto(self, conn, view):
+        # Fill view; False when the sender went away
+        got = 0
+        size = len(view)
+        while got < size:
+            try:
+                n = conn.recv_into(view[got:], size - got)
+            except socket.timeout:
+                if not self.dorun:
+                    return False
+                continue
+            if n == 0:
+                return False
+            got += n
+        return True
+
+    def receive(self, conn):
+        stream = self.stream
+        lock = frameLock(stream)
+        keyed = False
+        while self.dorun:
+            if not self.recvInto(conn, self.headerview):
+                return
+            magic, encoding, frame, size = MESSAGE.unpack_from(self.header)
+            if magic != MAGIC or size > len(self.buffer):
+                return
+            payload = self.bufferview[:size]
+            if not self.recvInto(conn, payload):
+                return
+            self.bytes += MESSAGE.size + size
+            if encoding == framecodec.DELTA and not keyed:
+                continue
+            if encoding == framecodec.RAW and size != stream.pixnum:
+                return
+            keyed = True
+            with lock:
+                stream.normalize()
+                low, high = framecodec.decodeFrame(encoding, payload, stream.data, stream.pixel_size)
+                if high > low:
+                    stream.markDirty(low, high)
+            self.frames += 1
+
+    def run(self):
+        while self.dorun:
+            try:
+                conn, addr = self.sock.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            conn.settimeout(0.5)
+            try:
+                self.receive(conn)
+            except (socket.error, ValueError, struct.error):
+                pass
+            finally:
+                conn.close()
+        self.sock.close()
+
+    def stop(self):
+        self.dorun = False
+
+# DMX over UDP, as sent by lighting desks. Each universe carries up to 512
+# channels; PyLED maps consecutive universes onto a stream, 170 RGB LEDs
+# to a universe unless told otherwise.
+
+E131_PORT = 5568
+ARTNET_PORT = 6454
+
+E131_ID = 'ASC-E1.17\0\0\0'
+E131_ROOT = struct.Struct('>HH12sHI')           # preamble, postamble, id, flags, vector
+E131_DATA = struct.Struct('>HI64sBHBBHHBBHHHB')  # framing and DMP layers up to the start code
+E131_SYNC = struct.Struct('>HIBH')              # framing layer of a sync packet
+E131_VECTOR_DATA = 0x00000004
+E131_VECTOR_EXTENDED = 0x00000008
+E131_VECTOR_SYNC = 0x00000001
+E131_PREVIEW = 0x40
+E131_HEADER = E131_ROOT.size + 16 + E131_DATA.size
+
+ARTNET_ID = 'Art-Net\0'
+ARTNET_OP = struct.Struct('<8sH')
+ARTNET_DMX = struct.Struct('<8sHHBBHH')         # id, opcode, version, sequence, physical, universe, length
+ARTNET_OP_DMX = 0x5000
+ARTNET_OP_SYNC = 0x5200
+
+DMX_CHANNELS = 512
+
+class UniverseMap:
+    # Where one universe lands: channels [0, size) are copied to
+    # stream.data[offset:offset + size]
+    def __init__(self, stream, offset, size):
+        self.stream = stream
+        self.offset = offset
+        self.size = size
+        self.sequence = None
+
+class UniverseReceiver(threading.Thread):
+    # Receives E1.31 (sACN) or Art-Net DMX packets into one preallocated
+    # buffer and copies each universe's channels straight into the stream
+    # it is mapped to.
+    #
+    # Until the sender starts synchronising, each universe marks its range
+    # dirty as it arrives and is shown on the strip's next tick. Synchronised
+    # universes (an E1.31 sync address, or once an ArtSync has been seen)
+    # are collected in a copy of the stream instead and land on the stream
+    # together when the sync packet arrives, so a frame is shown whole.
+    def __init__(self, protocol = 'e131', port = None, host = '', multicast = False):
+        threading.Thread.__init__(self)
+        if protocol not in ('e131', 'artnet'):
+            raise ValueError('Unknown protocol %r' % (protocol,))
+        self.protocol = protocol
+        if port is None:
+            port = E131_PORT if protocol == 'e131' else ARTNET_PORT
+        self.multicast = multicast
+        self.universes = dict()
+        self.staging = dict()
+        self.pending = dict()
+        self.synced = False
+        self.packets = 0
+        self.frames = 0
+        self.ignored = 0
+        self.buffer = bytearray(E131_HEADER + DMX_CHANNELS)
+        self.view = memoryview(self.buffer)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        self.name = "Universe Receiver Thread"
+        self.daemon = True
+        self.dorun = True
+
+    def mapUniverse(self, universe, stream, start = 0, leds = 170):
+        # Channels of universe go to LEDs start .. start + leds - 1 of stream
+        size = min(leds * stream.pixel_size, DMX_CHANNELS, stream.pixnum - start * stream.pixel_size)
+        if size <= 0:
+            raise RuntimeError('Universe does not fit on the stream')
+        self.universes[universe] = UniverseMap(stream, start * stream.pixel_size, size)
+        if self.multicast and self.protocol == 'e131':
+            group = socket.inet_aton('239.255.%d.%d' % (universe >> 8, universe & 0xff))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                 group + socket.inet_aton('0.0.0.0'))
+
+    def mapStream(self, stream, universe = 1, leds = 170):
+        # Spread stream over universes starting at universe; returns the
+        # next free universe
+        for start in xrange(0, stream.num_leds, leds):
+            self.mapUniverse(universe, stream, start, leds)
+            universe += 1
+        return universe
+
+    def parse(self, size):
+        # (universe, sequence, channel offset, channel count, sync), with a
+        # universe of None for a sync packet, or None to ignore the packet
+        buf = self.buffer
+        if self.protocol == 'artnet':
+            if size < ARTNET_OP.size:
+                return None
+            ident, opcode = ARTNET_OP.unpack_from(buf)
+            if ident != ARTNET_ID:
+                return None
+            if opcode == ARTNET_OP_SYNC:
+                self.synced = True
+                return (None, 0, 0, 0, 0)
+            if opcode != ARTNET_OP_DMX or size < ARTNET_DMX.size:
+                return None
+            ident, opcode, version, sequence, physical, universe, length = ARTNET_DMX.unpack_from(buf)
+            length = (length >> 8) | ((length & 0xff) << 8)
+            return (universe, sequence or None, ARTNET_DMX.size,
+                    min(length, size - ARTNET_DMX.size), self.synced)
+
+        if size < E131_ROOT.size:
+            return None
+        preamble, postamble, ident, flags, vector = E131_ROOT.unpack_from(buf)
+        if ident != E131_ID:
+            return None
+        if vector == E131_VECTOR_EXTENDED:
+            if size < E131_ROOT.size + 16 + E131_SYNC.size:
+                return None
+            flags, vector, sequence, address = E131_SYNC.unpack_from(buf, E131_ROOT.size + 16)
+            if vector != E131_VECTOR_SYNC:
+                return None
+            return (None, sequence, 0, 0, address)
+        if vector != E131_VECTOR_DATA or size < E131_HEADER:
+            return None
+        (flags, vector, name, priority, address, sequence, options, universe,
+         flags, dmpvector, addrtype, first, increment, count, startcode) = \
+            E131_DATA.unpack_from(buf, E131_ROOT.size + 16)
+        if options & E131_PREVIEW or startcode != 0:
+            return None
+        return (universe, sequence, E131_HEADER, min(count - 1, size - E131_HEADER), address)
+
+    def receive(self, size):
+        packet = self.parse(size)
+        if packet is None:
+            self.ignored += 1
+            return
+        universe, sequence, start, count, sync = packet
+        if universe is None:
+            self.sync()
+            return
+        umap = self.universes.get(universe)
+        if umap is None:
+            self.ignored += 1
+            return
+        if sequence is not None and umap.sequence is not None:
+            # E1.31 drops packets up to 20 behind the last one
+            if -20 < ((sequence - umap.sequence + 128) & 0xff) - 128 <= 0:
+                self.ignored += 1
+                return
+        umap.sequence = sequence
+        self.packets += 1
+
+        stream = umap.stream
+        count = min(count, umap.size)
+        low = umap.offset
+        high = low + count
+        if sync:
+            staging = self.staging.get(stream)
+            if staging is None:
+                with frameLock(stream):
+                    stream.normalize()
+                    staging = self.staging[stream] = memoryview(bytearray(stream.data))
+            staging[low:high] = self.view[start:start + count]
+            pend = self.pending.get(stream)
+            if pend is not None:
+                low = min(low, pend[0])
+                high = max(high, pend[1])
+            self.pending[stream] = (low, high)
+        else:
+            with frameLock(stream):
+                stream.normalize()
+                stream.data[low:high] = self.view[start:start + count]
+                stream.markDirty(low, high)
+            self.frames += 1
+
+    def sync(self):
+        # Everything collected since the last sync goes out as one frame
+        for stream, (low, high) in self.pending.iteritems():
+            with frameLock(stream):
+                stream.normalize()
+                stream.data[low:high] = self.staging[stream][low:high]
+                stream.markDirty(low, high)
+        if self.pending:
+            self.frames += 1
+        self.pending.clear()
+
+    def run(self):
+        while self.dorun:
+            try:
+                size = self.sock.recv_into(self.buffer)
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            self.receive(size)
+        self.sock.close()
+
+    def stop(self):
+        self.dorun = False
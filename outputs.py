@@ -0,0 +1,305 @@
+#####################################
+# outputs.py                        #
+# Author: noriah                    #
+# Frame sinks for PyLED Strips      #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+import os
+import time
+import errno
+import ctypes
+import struct
+import threading
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# linux/spi/spidev.h
+SPI_IOC_WR_MODE = 0x40016b01
+SPI_IOC_WR_BITS_PER_WORD = 0x40016b03
+SPI_IOC_WR_MAX_SPEED_HZ = 0x40046b04
+
+# struct spi_ioc_transfer: tx_buf, rx_buf, len, speed_hz, delay_usecs,
+# bits_per_word, cs_change, tx_nbits, rx_nbits, word_delay_usecs, pad
+SPI_TRANSFER = struct.Struct('=QQIIHBBBBBB')
+
+def SPI_IOC_MESSAGE(count):
+    # _IOW('k', 0, struct spi_ioc_transfer[count])
+    return 0x40006b00 | ((SPI_TRANSFER.size * count) << 16)
+
+SPIDEV_BUFSIZ = '/sys/module/spidev/parameters/bufsiz'
+
+# WS2801 chips latch their data once the clock has been idle this long
+WS2801_LATCH = 0.0005
+
+class Output:
+    # A Strip hands every frame to write(); data is only valid for the
+    # duration of the call, so anything kept must be copied.
+    def write(self, data):
+        return
+
+    def close(self):
+        return
+
+class FileOutput(Output):
+    # A plain file or FIFO, e.g. to pipe frames to a simulator
+    def __init__(self, fname):
+        self.fname = fname
+        self.file = file(fname, "wb")
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class SpiOutput(FileOutput):
+    # A spidev device, driven with SPI_IOC_MESSAGE ioctls. The driver
+    # refuses messages over bufsiz bytes, so a frame goes out as one
+    # transfer per bufsiz bytes, back to back (well inside the latch time,
+    # so the chips do not latch half a frame). The last transfer of a frame
+    # holds the clock idle for the latch time before the ioctl returns, so
+    # the next frame can never start early. speed sets the clock in Hz.
+    #
+    # device replaces the real device with anything that has an ioctl()
+    # method, such as a FakeSpiDevice. Without fcntl, or on something
+    # that is not a spidev device, frames are written to the file in
+    # bufsiz pieces instead and the latch time is slept out.
+    def __init__(self, fname = '/dev/spidev0.0', speed = None, bufsiz = None, latch = WS2801_LATCH, device = None):
+        self.fname = fname
+        self.device = device
+        self.file = file(fname, "wb") if device is None else None
+        self.bufsiz = bufsiz if bufsiz else spidev_bufsiz()
+        self.latch = latch
+        self.useioctl = device is not None or fcntl is not None
+        self.ready = 0.0
+        self.txbuf = bytearray()
+        self.txaddr = 0
+        self.transfers = 0
+        self.speed = None
+        if speed is not None:
+            self.setSpeed(speed)
+
+    def ioctl(self, request, arg):
+        if self.device is not None:
+            return self.device.ioctl(request, arg)
+        return fcntl.ioctl(self.file.fileno(), request, arg)
+
+    def setSpeed(self, speed):
+        if not self.useioctl:
+            raise RuntimeError('Setting the SPI clock needs fcntl')
+        self.ioctl(SPI_IOC_WR_MAX_SPEED_HZ, struct.pack('=I', speed))
+        self.speed = speed
+
+    def write(self, data):
+        if self.useioctl:
+            try:
+                self.transfer(data)
+                return
+            except IOError as e:
+                if e.errno not in (errno.ENOTTY, errno.EINVAL) or self.device is not None:
+                    raise
+                self.useioctl = False
+        self.writeFile(data)
+
+    def transfer(self, data):
+        size = len(data)
+        if size != len(self.txbuf):
+            # the kernel reads straight out of txbuf, so its address is
+            # only looked up when the frame size changes
+            self.txbuf = bytearray(size)
+            self.txaddr = ctypes.addressof((ctypes.c_char * size).from_buffer(self.txbuf)) if size else 0
+        self.txbuf[:] = data
+        # delay_usecs is 16 bits; anything longer is slept out
+        delay = int(self.latch * 1000000 + 0.5)
+        held = min(delay, 0xffff)
+        speed = self.speed or 0
+        for start in xrange(0, size, self.bufsiz):
+            length = min(self.bufsiz, size - start)
+            last = start + length == size
+            message = SPI_TRANSFER.pack(self.txaddr + start, 0, length, speed,
+                                        held if last else 0, 8, 0, 0, 0, 0, 0)
+            self.ioctl(SPI_IOC_MESSAGE(1), message)
+            self.transfers += 1
+        if delay > held:
+            time.sleep((delay - held) / 1000000.0)
+
+    def writeFile(self, data):
+        wait = self.ready - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        size = len(data)
+        if size <= self.bufsiz:
+            self.file.write(data)
+        else:
+            view = memoryview(data)
+            for start in xrange(0, size, self.bufsiz):
+                self.file.write(view[start:start + self.bufsiz])
+        self.file.flush()
+        self.ready = time.time() + self.latch
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class FakeSpiDevice:
+    # Takes the ioctls SpiOutput makes, checks them the way the spidev
+    # driver would and keeps every transfer, so chunking can be checked
+    # without hardware. A transfer that holds the clock for at least
+    # latch seconds ends a frame.
+    def __init__(self, bufsiz = 4096, speed = 500000, latch = WS2801_LATCH):
+        self.bufsiz = bufsiz
+        self.speed = speed
+        self.latch = latch
+        self.transfers = list()
+        self.messages = 0
+
+    def ioctl(self, request, arg):
+        if request == SPI_IOC_WR_MAX_SPEED_HZ:
+            self.speed = struct.unpack('=I', arg)[0]
+            return arg
+        if request & 0xc000ffff != SPI_IOC_MESSAGE(0):
+            raise IOError(errno.ENOTTY, 'Unsupported ioctl 0x%08x' % request)
+        size = (request >> 16) & 0x3fff
+        if size == 0 or size % SPI_TRANSFER.size or len(arg) != size:
+            raise IOError(errno.EINVAL, 'Bad SPI_IOC_MESSAGE size')
+        transfers = list()
+        total = 0
+        for offset in xrange(0, size, SPI_TRANSFER.size):
+            tx, rx, length, speed, delay, bits = SPI_TRANSFER.unpack_from(arg, offset)[:6]
+            total += length
+            transfers.append((ctypes.string_at(tx, length) if length else '',
+                              speed or self.speed, delay, bits))
+        if total > self.bufsiz:
+            raise IOError(errno.EMSGSIZE, 'Message longer than bufsiz')
+        self.transfers.extend(transfers)
+        self.messages += 1
+        return arg
+
+    def frames(self):
+        # what the chips would have latched, in order
+        frames = list()
+        current = bytearray()
+        held = int(self.latch * 1000000 + 0.5)
+        for data, speed, delay, bits in self.transfers:
+            current += data
+            if delay >= held:
+                frames.append(bytes(current))
+                current = bytearray()
+        return frames
+
+    def wireTime(self):
+        # seconds the bus was busy, clock idle times included
+        return sum(len(data) * 8.0 / speed + delay / 1000000.0
+                   for data, speed, delay, bits in self.transfers)
+
+    def clear(self):
+        self.transfers = list()
+        self.messages = 0
+
+class NullOutput(Output):
+    # Throws frames away, counting them
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.frames += 1
+        self.bytes += len(data)
+
+class MemoryOutput(NullOutput):
+    # Keeps copies of the last `size` frames in preallocated buffers
+    def __init__(self, size = 64):
+        NullOutput.__init__(self)
+        self.size = size
+        self.buffers = [bytearray() for _ in xrange(size)]
+        self.ring = deque(maxlen = size)
+
+    def write(self, data):
+        buf = self.buffers[self.frames % self.size]
+        buf[:] = data
+        self.ring.append(buf)
+        NullOutput.write(self, data)
+
+    def __len__(self):
+        return len(self.ring)
+
+    def getFrames(self):
+        # oldest first
+        return list(self.ring)
+
+    def lastFrame(self):
+        return self.ring[-1] if self.ring else None
+
+class BufferedOutput(Output):
+    # Triple-buffered wrapper that moves the writes of another Output onto a
+    # writer thread of its own. write() copies the frame into a spare
+    # buffer and publishes it; the writer always sends the newest published
+    # frame, so when the device falls behind frames are dropped rather than
+    # queued. Buffers change hands by swapping references only.
+    def __init__(self, output):
+        self.output = output
+        self.spare = bytearray()
+        self.pending = bytearray()
+        self.current = bytearray()
+        self.haspending = False
+        self.frames = 0
+        self.dropped = 0
+        self.dorun = True
+        self.cond = threading.Condition()
+        self.writer = threading.Thread(target = self.run, name = "Strip Writer Thread")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def write(self, data):
+        self.spare[:] = data
+        with self.cond:
+            if self.haspending:
+                self.dropped += 1
+            self.spare, self.pending = self.pending, self.spare
+            self.haspending = True
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.dorun and not self.haspending:
+                    self.cond.wait()
+                if not self.haspending:
+                    return
+                self.pending, self.current = self.current, self.pending
+                self.haspending = False
+            self.output.write(self.current)
+            self.frames += 1
+
+    def close(self):
+        # sends any frame still pending before closing the wrapped output
+        with self.cond:
+            self.dorun = False
+            self.cond.notify()
+        self.writer.join()
+        self.output.close()
+
+def spidev_bufsiz(default = 4096):
+    try:
+        with open(SPIDEV_BUFSIZ) as f:
+            return int(f.read())
+    except (IOError, ValueError):
+        return default
+
+def openOutput(fname):
+    # Strips accept either an Output or a path: spidev devices get an
+    # SpiOutput, anything else a FileOutput.
+    if isinstance(fname, Output):
+        return fname
+    if os.path.basename(fname).startswith('spidev'):
+        return SpiOutput(fname)
+    return FileOutput(fname)
+
+__all__ = ['Output', 'FileOutput', 'SpiOutput', 'FakeSpiDevice', 'NullOutput', 'MemoryOutput',
+           'BufferedOutput', 'openOutput']
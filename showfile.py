@@ -0,0 +1,162 @@
+#####################################
+# showfile.py                       #
+# Author: noriah                    #
+# Prerendered shows on disk         #
+# Copyright (c) 2014 noriah         #
+#####################################
+
+# A show file holds every frame an animation produced, so a slow machine
+# can replay effects it could never compute in real time:
+#
+#   header  <4s magic><u16 version><u16 pixel_size><u32 num_leds>
+#           <u32 count><u32 length><f32 fps><u32 index offset>
+#   frames  payloads encoded with framecodec, back to back
+#   index   count entries of <u32 frame><u32 offset><u32 size><u8 encoding>
+#
+# ShowFile maps the file with mmap and looks like a FrameSequence, so the
+# playback animation runs it as is:
+#
+#   stream.animate(PyLED.playback(ShowFile('show.pls'), loop = True))
+
+import mmap
+import struct
+
+import PyLED
+import framecodec
+
+MAGIC = 'PLSH'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIIIfI')
+ENTRY = struct.Struct('<IIIB')
+
+class ShowWriter:
+    # Appends frames to a show file as they are produced. Every
+    # `keyframes` frames one is stored without a delta so seeking never
+    # has to decode far.
+    def __init__(self, fname, num_leds, pixel_size = 3, fps = 0, rle = True, keyframes = 300, block = 48):
+        self.fname = fname
+        self.num_leds = num_leds
+        self.pixel_size = pixel_size
+        self.pixnum = num_leds * pixel_size
+        self.fps = fps
+        self.rle = rle
+        self.keyframes = keyframes
+        self.block = block
+        self.index = list()
+        self.prev = None
+        self.file = file(fname, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, pixel_size, num_leds, 0, 0, fps, 0))
+        self.offset = HEADER.size
+
+    def write(self, frame, data):
+        if len(data) != self.pixnum:
+            raise ValueError('Frame is %d bytes, expected %d' % (len(data), self.pixnum))
+        prev = self.prev
+        if self.keyframes and len(self.index) % self.keyframes == 0:
+            prev = None
+        encoding, payload = framecodec.encodeFrame(prev, data, self.pixel_size, self.rle, self.block)
+        self.file.write(payload)
+        self.index.append((frame, self.offset, len(payload), encoding))
+        self.offset += len(payload)
+        self.prev = framecodec.asBytes(data)
+
+    def close(self, length):
+        # length is the frame the show ends on
+        for entry in self.index:
+            self.file.write(ENTRY.pack(*entry))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.pixel_size, self.num_leds,
+                                    len(self.index), length, self.fps, self.offset))
+        self.file.close()
+
+class ShowFile:
+    # Read only view of a show file. Frames are decoded into one buffer,
+    # so getFrame() is only valid until the next call; playing in order
+    # costs one patch per frame.
+    def __init__(self, fname):
+        self.fname = fname
+        self.file = file(fname, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, version, self.pixel_size, self.num_leds, count, self.length, self.fps, offset = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a show file' % fname)
+        if version != VERSION:
+            raise ValueError('Unsupported show file version %d' % version)
+
+        self.pixnum = self.num_leds * self.pixel_size
+        self.frames = list()
+        self.entries = list()
+        for i in xrange(count):
+            frame, start, size, encoding = ENTRY.unpack_from(self.map, offset + i * ENTRY.size)
+            self.frames.append(frame)
+            self.entries.append((start, size, encoding))
+
+        self.current = bytearray(self.pixnum)
+        self.position = -1
+
+    def __len__(self):
+        return len(self.frames)
+
+    def decode(self, index):
+        start, size, encoding = self.entries[index]
+        framecodec.decodeFrame(encoding, self.map[start:start + size], self.current, self.pixel_size)
+        self.position = index
+
+    def getFrame(self, index):
+        if index != self.position:
+            if index < self.position or self.position < 0:
+                # back up to the nearest frame that decodes on its own
+                key = index
+                while key > 0 and self.entries[key][2] == framecodec.DELTA:
+                    key -= 1
+                self.decode(key)
+            while self.position < index:
+                self.decode(self.position + 1)
+        return self.current
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+def saveShow(fname, sequence, fps = 0, rle = True, keyframes = 300, block = 48):
+    # Write a FrameSequence, e.g. from PyLED.precompile(), to fname
+    writer = ShowWriter(fname, sequence.num_leds, sequence.pixel_size, fps, rle, keyframes, block)
+    for i, frame in enumerate(sequence.frames):
+        writer.write(frame, sequence.getFrame(i))
+    writer.close(sequence.length)
+
+def exportShow(fname, animation, num_leds, start = None, pixel_size = 3, fps = 0,
+               maxframes = 1000000, rle = True, keyframes = 300, block = 48):
+    # Run animation headless like PyLED.precompile(), writing each frame
+    # straight to disk so long shows never have to fit in memory.
+    if start is None:
+        start = bytearray(num_leds * pixel_size)
+    stream = PyLED.Stream(num_leds, None, pixel_size)
+    stream.setStream(start)
+    stream.clean()
+    animation.setParent(stream)
+
+    writer = ShowWriter(fname, num_leds, pixel_size, fps, rle, keyframes, block)
+    frame = 0
+    try:
+        while True:
+            wake = animation.advance(frame)
+            if stream.dirty:
+                writer.write(frame, stream.logical())
+                stream.clean()
+            if wake is None:
+                break
+            frame = wake
+            if frame > maxframes:
+                raise RuntimeError('Animation did not finish within %d frames' % maxframes)
+    finally:
+        writer.close(frame)
+        animation.reset()
+
+def play(stream, fname, loop = False):
+    show = ShowFile(fname)
+    stream.animate(PyLED.playback(show, loop))
+    return show
@@ -0,0 +1,74 @@
+import unittest
+
+import PyLED
+import time
+
+from outputs import MemoryOutput
+from colors import RED, BLUE
+
+asyncio = PyLED.asyncio
+
+@unittest.skipIf(asyncio is None, 'needs asyncio or trollius')
+class AsyncStripWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.output = MemoryOutput()
+        self.strip = PyLED.AsyncStrip(6, self.output, fps = 100, loop = self.loop)
+        self.strip.begin()
+
+    def tearDown(self):
+        self.strip.stop()
+        self.loop.close()
+
+    def animate(self, stream, animation):
+        self.loop.run_until_complete(self.strip.animate(stream, animation))
+        if self.strip.writing is not None:
+            self.loop.run_until_complete(self.strip.writing)
+
+    def testWritesFrame(self):
+        stream = self.strip.newstream(6)
+        self.animate(stream, PyLED.fill(BLUE))
+        written = self.output.lastFrame()
+        self.assertEqual(bytes(written), self.strip.getFrame().tobytes())
+        self.assertEqual(bytes(written), BLUE * 6)
+
+    def testWritesComposedFrame(self):
+        stream = self.strip.newstream(6)
+        layer = self.strip.newlayer(2, 4, 'add', 1.0)
+        layer.fill(BLUE)
+        self.animate(stream, PyLED.fill(RED))
+        written = self.output.lastFrame()
+        self.assertEqual(bytes(written), self.strip.getFrame().tobytes())
+        self.assertEqual(bytes(written), RED * 4 + '\xff\x00\xff' * 2)
+
+class SlowOutput(MemoryOutput):
+    def write(self, data):
+        time.sleep(0.2)
+        MemoryOutput.write(self, data)
+
+@unittest.skipIf(asyncio is None, 'needs asyncio or trollius')
+class AsyncStripSlowWriteTest(unittest.TestCase):
+    def testNoSpinWhileWriting(self):
+        loop = asyncio.new_event_loop()
+        output = SlowOutput()
+        strip = PyLED.AsyncStrip(6, output, fps = 100, loop = loop)
+        steps = [0]
+        step = strip.step
+        def counted():
+            steps[0] += 1
+            step()
+        strip.step = counted
+        stream = strip.newstream(6)
+        strip.begin()
+        loop.run_until_complete(strip.animate(stream, PyLED.fill(RED)))
+        # changed while the first frame is still being written
+        stream.fill(BLUE)
+        while output.frames < 2:
+            loop.run_until_complete(asyncio.sleep(0.05, loop = loop))
+        strip.stop()
+        loop.close()
+        self.assertEqual(bytes(output.lastFrame()), BLUE * 6)
+        self.assertLess(steps[0], 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import colors
+from colors import parseColor, DIMGRAY
+
+class ParseColorTest(unittest.TestCase):
+    def testConstantsRoundTrip(self):
+        for name, value in colors.colorNames().items():
+            self.assertEqual(parseColor(value), value, name)
+            self.assertEqual(parseColor(bytearray(value)), value, name)
+            self.assertEqual(parseColor(memoryview(value)), value, name)
+            self.assertEqual(parseColor(tuple(bytearray(value))), value, name)
+            self.assertEqual(parseColor('#' + value.encode('hex')), value, name)
+            self.assertEqual(parseColor(unicode(name.lower())), getattr(colors, name), name)
+
+    def testPixels(self):
+        grey = bytes(bytearray([100, 100, 100]))
+        self.assertEqual(parseColor(grey), grey)
+        self.assertEqual(parseColor(DIMGRAY), DIMGRAY)
+        self.assertEqual(parseColor('\xdd\xdd\xdd'), '\xdd\xdd\xdd')
+
+    def testShortNames(self):
+        for text in ('red', 'Red', 'RED', u'red'):
+            self.assertEqual(parseColor(text), colors.RED)
+        self.assertEqual(parseColor('tan'), colors.TAN)
+        self.assertEqual(colors.gradientTable(['red', 'blue'], 2), colors.RED + '\x7f\x00\x7f' + colors.BLUE)
+
+    def testText(self):
+        self.assertEqual(parseColor('Dark Orange'), colors.DARKORANGE)
+        self.assertEqual(parseColor('#f80'), '\xff\x88\x00')
+        self.assertEqual(parseColor('0xff8000'), '\xff\x80\x00')
+        self.assertEqual(parseColor('ff8000'), '\xff\x80\x00')
+        self.assertEqual(parseColor('hsv(120, 1, 1)'), colors.LIME)
+        self.assertRaises(ValueError, parseColor, 'notacolour')
+        self.assertRaises(ValueError, parseColor, 'ff80')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+import PyLED
+from outputs import MemoryOutput
+from colors import RED, BLUE
+
+class StopParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.output = MemoryOutput()
+        self.strip = PyLED.Strip(8, self.output, fps = 100)
+        self.streams = [self.strip.newstream(4), self.strip.newstream(4)]
+
+    def testAnimateAfterStop(self):
+        for stream in self.streams:
+            stream.animate(PyLED.shift(cycles = 1000))
+        self.assertEqual(self.strip.enableParallel(2), 2)
+        for frame in xrange(3):
+            self.strip.tick(frame)
+        self.strip.stopParallel()
+
+        for stream in self.streams:
+            self.assertFalse(stream.hasAnimation())
+        self.streams[0].animate(PyLED.fill(RED))
+        self.streams[1].animate(PyLED.fill(BLUE))
+        self.assertEqual(self.strip.nextFrame(), self.strip.framenum)
+        self.strip.tick(3)
+        self.assertEqual(bytes(self.output.lastFrame()), RED * 4 + BLUE * 4)
+        self.assertEqual(self.strip.nextFrame(), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import PyLED
+from colors import RED, GREEN, BLUE
+
+def drive(animation, num_leds, frames):
+    # Step animation like the scheduler would and return the stream's
+    # contents on every frame
+    stream = PyLED.Stream(num_leds, None)
+    animation.setParent(stream)
+    shown = list()
+    wake = 0
+    for frame in xrange(frames):
+        if wake is not None and frame == wake:
+            wake = animation.advance(frame)
+        shown.append(stream.logical().tobytes())
+    return shown
+
+def group(*animations):
+    g = PyLED.AnimationGroup()
+    for animation in animations:
+        g.add(animation)
+    g.repeat(infinite = True)
+    return g
+
+class LoopedPlaybackTest(unittest.TestCase):
+    def checkLoop(self, make):
+        seq = PyLED.precompile(make(), 4, cache = None)
+        live = drive(make(), 4, 40)
+        played = drive(PyLED.playback(seq, True), 4, 40)
+        self.assertEqual(played, live)
+
+    def testChangeOnLastFrame(self):
+        self.checkLoop(lambda: group(PyLED.fill(RED), PyLED.wait(2), PyLED.fill(BLUE)))
+
+    def testWaitAfterLastChange(self):
+        self.checkLoop(lambda: group(PyLED.fill(RED), PyLED.fill(BLUE), PyLED.wait(3)))
+
+    def testWaitBeforeFirstChange(self):
+        self.checkLoop(lambda: group(PyLED.wait(2), PyLED.fill(RED), PyLED.fill(GREEN)))
+
+    def testSingleFrame(self):
+        self.checkLoop(lambda: group(PyLED.fill(RED)))
+
+    def testOnce(self):
+        make = lambda: group(PyLED.fill(RED), PyLED.wait(3), PyLED.fill(BLUE), PyLED.wait(2))
+        seq = PyLED.precompile(make(), 4, cache = None)
+        once = make()
+        once.repeat(0)
+        self.assertEqual(drive(PyLED.playback(seq), 4, 40), drive(once, 4, 40))
+
+class InfiniteGroupTest(unittest.TestCase):
+    def testCompilesOnePass(self):
+        g = group(PyLED.fill(RED), PyLED.wait(2), PyLED.fill(BLUE))
+        seq = PyLED.precompile(g, 4, cache = None)
+        self.assertEqual(len(seq), 2)
+        self.assertTrue(g.repeatsForever())
+
+    def testStreamPrecompileLoops(self):
+        stream = PyLED.Stream(4, None)
+        anim = stream.precompile(group(PyLED.fill(RED), PyLED.fill(BLUE)))
+        self.assertTrue(anim.loop)
+
+    def testNestedInfiniteFailsEarly(self):
+        inner = group(PyLED.fill(RED), PyLED.fill(BLUE))
+        outer = PyLED.AnimationGroup()
+        outer.add(inner)
+        self.assertRaises(RuntimeError, PyLED.precompile, outer, 1000, cache = None, maxbytes = 300000)
+
+class CacheTest(unittest.TestCase):
+    def testGroupWithRandomChildIsNotCached(self):
+        make = lambda: group(PyLED.wave([RED, BLUE], 1, 0))
+        cache = PyLED.FrameCache()
+        first = PyLED.precompile(make(), 30, cache = cache)
+        second = PyLED.precompile(make(), 30, cache = cache)
+        self.assertFalse(make().deterministic)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(cache), 0)
+
+    def testKeyedOnStreamContents(self):
+        cache = PyLED.FrameCache()
+        stream = PyLED.Stream(4, None)
+        stream.fill(RED)
+        red = PyLED.precompile(PyLED.flash(), 4, stream.data, cache = cache)
+        stream.fill(BLUE)
+        blue = PyLED.precompile(PyLED.flash(), 4, stream.data, cache = cache)
+        self.assertIsNot(red, blue)
+        self.assertEqual(len(cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import PyLED
+from colors import RED, GREEN, BLUE
+
+class SetLEDsTest(unittest.TestCase):
+    def streams(self):
+        # with and without the numpy path
+        plain = PyLED.Stream(4, None)
+        plain.array = None
+        return [PyLED.Stream(4, None), plain]
+
+    def testMemoryviewBuffer(self):
+        source = memoryview(bytearray(RED + GREEN + BLUE))
+        for stream in self.streams():
+            stream.setLEDs([3, 0, 1], source)
+            self.assertEqual(stream.getStream(), bytearray(GREEN + BLUE + '\0\0\0' + RED))
+
+    def testMemoryviewPixel(self):
+        source = memoryview(bytearray(BLUE))
+        for stream in self.streams():
+            stream.setLEDs([1, 2], source)
+            self.assertEqual(stream.getStream(), bytearray('\0\0\0' + BLUE * 2 + '\0\0\0'))
+
+    def testFrameSequenceFrame(self):
+        seq = PyLED.FrameSequence(4, 3, RED * 4 + BLUE * 4, [0, 1], 1)
+        for stream in self.streams():
+            stream.setLEDs(range(4), seq.getFrame(1))
+            self.assertEqual(stream.getStream(), bytearray(BLUE * 4))
+
+class SetRangeTest(unittest.TestCase):
+    def testEmptyRange(self):
+        stream = PyLED.Stream(4, None)
+        stream.setRange(2, 2, RED)
+        stream.setRange(3, 1, RED)
+        self.assertEqual(stream.getStream(), bytearray(12))
+        self.assertFalse(stream.dirty)
+
+    def testPixelRepeated(self):
+        stream = PyLED.Stream(4, None)
+        stream.setRange(1, 2, RED)
+        stream.setRange(2, 4, BLUE)
+        self.assertEqual(stream.getStream(), bytearray('\0\0\0' + RED + BLUE * 2))
+
+    def testIndexedEmptyRange(self):
+        stream = PyLED.IndexedStream(4, None, PyLED.Palette([RED]))
+        stream.setRange(2, 2, BLUE)
+        self.assertFalse(stream.dirty)
+
+if __name__ == '__main__':
+    unittest.main()